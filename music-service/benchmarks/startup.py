@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+UPSTREAM_MODULES = ("gmusicapi", "oauth2client", "mutagen", "PIL", "requests")
+
+SCRIPT = """
+import json
+import sys
+import time
+
+start = time.perf_counter()
+import music_service
+
+imported = time.perf_counter()
+app = music_service.create_app(json.loads(sys.argv[1]))
+booted = time.perf_counter()
+response = app.test_client().post("/graphql", json={"query": "{ __typename }"})
+served = time.perf_counter()
+
+assert response.status_code == 200, response.get_data()
+print(
+    json.dumps(
+        {
+            "import": imported - start,
+            "boot": booted - start,
+            "first_request": served - start,
+            "upstream_modules": sorted(
+                name for name in json.loads(sys.argv[2]) if name in sys.modules
+            ),
+        }
+    )
+)
+"""
+
+
+def measure(runs=3):
+    samples = [run_once() for _ in range(runs)]
+    result = {
+        metric: min(sample[metric] for sample in samples)
+        for metric in ("import", "boot", "first_request")
+    }
+    result["upstream_modules"] = sorted(
+        {name for sample in samples for name in sample["upstream_modules"]}
+    )
+
+    return result
+
+
+def run_once():
+    env = dict(os.environ)
+    for name, value in (
+        ("DEVICE_ID", "0123456789abcdef"),
+        ("UPLOADER_ID", "00:00:00:00:00:00"),
+        ("UPLOADER_NAME", "Startup Benchmark"),
+    ):
+        env.setdefault(name, value)
+
+    with tempfile.TemporaryDirectory() as directory:
+        config = {
+            "TESTING": True,
+            "LIBRARY_SNAPSHOT_DIR": os.path.join(directory, "libraries"),
+            "ALBUM_ART_DIR": os.path.join(directory, "art"),
+        }
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                SCRIPT,
+                json.dumps(config),
+                json.dumps(UPSTREAM_MODULES),
+            ],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=env,
+            stdout=subprocess.PIPE,
+            check=True,
+        ).stdout
+
+    return json.loads(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure import, boot and time-to-first-request in a fresh "
+        "interpreter."
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    result = measure(runs=args.runs)
+    for metric in ("import", "boot", "first_request"):
+        print("{:<16} {:>10.1f} ms".format(metric, result[metric] * 1000))
+    print("upstream modules {}".format(", ".join(result["upstream_modules"]) or "-"))
+    return 1 if result["upstream_modules"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
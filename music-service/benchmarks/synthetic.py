@@ -0,0 +1,81 @@
+import random
+from itertools import accumulate
+
+WORDS = (
+    "love night heart blue fire dream rain summer light road home river gold "
+    "wild city dance ghost stone echo shadow ocean sky star moon sun young "
+    "broken electric silver midnight paper glass thunder velvet northern lost"
+).split()
+
+
+def generate_library(count, seed=0):
+    rng = random.Random(seed)
+    artists = [
+        "{} {}".format(phrase(rng, 2), index) for index in range(artist_count(count))
+    ]
+    weights = list(accumulate(1 / (rank + 1) for rank in range(len(artists))))
+    albums = {}
+
+    songs = []
+    for index in range(count):
+        artist = rng.choices(artists, cum_weights=weights)[0]
+        album = pick_album(rng, albums.setdefault(artist, []), artist)
+        album["tracks"] += 1
+
+        song = {
+            "id": "{:08x}-{:04x}".format(rng.getrandbits(32), index % 0x10000),
+            "title": phrase(rng, rng.randint(1, 4)).title(),
+            "creationTimestamp": str(1262304000000000 + index * 1000000),
+        }
+        if rng.random() > 0.02:
+            song["artist"] = (
+                artist
+                if rng.random() > 0.1
+                else "{}, {}".format(artist, rng.choice(artists))
+            )
+        if rng.random() > 0.03:
+            song["album"] = album["name"]
+            song["albumArtist"] = artist
+            song["discNumber"] = album["discs"]
+            song["totalDiscCount"] = album["discs"]
+            if rng.random() > 0.05:
+                song["trackNumber"] = album["tracks"]
+            if rng.random() > 0.2:
+                song["totalTrackCount"] = album["size"]
+            if rng.random() > 0.1:
+                song["albumArtRef"] = [{"url": album["art"]}]
+        if rng.random() > 0.08:
+            song["year"] = album["year"]
+
+        songs.append(song)
+
+    return songs
+
+
+def artist_count(count):
+    return max(1, count // 40)
+
+
+def pick_album(rng, albums, artist):
+    if not albums or (
+        albums[-1]["tracks"] >= albums[-1]["size"] and rng.random() < 0.7
+    ):
+        albums.append(
+            {
+                "name": phrase(rng, rng.randint(1, 3)).title(),
+                "size": rng.randint(6, 16),
+                "discs": 1 if rng.random() > 0.1 else 2,
+                "year": rng.randint(1960, 2020),
+                "art": "https://lh3.googleusercontent.com/{}/{}".format(
+                    artist.replace(" ", "-"), len(albums)
+                ),
+                "tracks": 0,
+            }
+        )
+        return albums[-1]
+
+    return rng.choice(albums)
+
+
+def phrase(rng, length):
+    return " ".join(rng.choice(WORDS) for _ in range(length))
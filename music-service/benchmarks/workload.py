@@ -0,0 +1,163 @@
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+from music_service.library import Library
+from music_service.loaders import Loaders
+from music_service.schema import schema
+
+from .synthetic import generate_library
+
+QUERIES = {
+    "songs": "{ songs { id title } }",
+    "songs_search": '{ songs(search: "love") { id title year } }',
+    "songs_title_page": '{ songs(title: "night", first: 20, skip: 20) { id title } }',
+    "songs_unsorted": "{ songs(first: 50, sorted: false) { id title } }",
+    "songs_recent": "{ songs(orderBy: RECENTLY_ADDED, first: 20) { id title } }",
+    "songs_by_artist": '{ songs(search: "love", orderBy: ARTIST, first: 10) { id } }',
+    "albums_by_year": "{ albums(orderBy: YEAR) { name } }",
+    "artists_search": '{ artists(search: "blue") { name } }',
+    "albums_page": "{ albums(first: 50) { name totalTrackCount albumArtUrl } }",
+    "songs_connection": """{
+        songsConnection(first: 50) {
+            edges { cursor node { title album { name } } }
+            pageInfo { hasNextPage endCursor }
+        }
+    }""",
+    "artists_nested": """{
+        artists(first: 25) {
+            name
+            albums { name artist { name } tracks { title trackNumber } }
+        }
+    }""",
+}
+
+
+def run_workload(library, queries=QUERIES, iterations=20):
+    results = {}
+    for name, query in queries.items():
+        execute(library, query)
+
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            execute(library, query)
+            timings.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        execute(library, query)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timings.sort()
+        results[name] = {
+            "p50": percentile(timings, 50),
+            "p90": percentile(timings, 90),
+            "p99": percentile(timings, 99),
+            "peak_bytes": peak,
+        }
+
+    return results
+
+
+def execute(library, query):
+    result = schema.execute(
+        query, context_value={"loaders": Loaders(lambda ready: library)}
+    )
+    if result.errors:
+        raise result.errors[0]
+    return result.data
+
+
+def percentile(values, percent):
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[index]
+
+
+def compare(results, baseline, tolerance=1.25):
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in ("p50", "p90", "peak_bytes"):
+            if result[metric] > baseline[name][metric] * tolerance:
+                regressions.append(
+                    (name, metric, baseline[name][metric], result[metric])
+                )
+
+    return regressions
+
+
+def report(songs, results):
+    print("{} songs".format(songs))
+    print(
+        "{:<20} {:>10} {:>10} {:>10} {:>12}".format(
+            "query", "p50 ms", "p90 ms", "p99 ms", "peak KiB"
+        )
+    )
+    for name, result in results.items():
+        print(
+            "{:<20} {:>10.2f} {:>10.2f} {:>10.2f} {:>12.1f}".format(
+                name,
+                result["p50"] * 1000,
+                result["p90"] * 1000,
+                result["p99"] * 1000,
+                result["peak_bytes"] / 1024,
+            )
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark schema resolvers against a synthetic library."
+    )
+    parser.add_argument("--songs", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--save", help="write results to this baseline file")
+    parser.add_argument("--compare", help="compare results with this baseline file")
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    regressions = []
+    for songs in args.songs:
+        library = Library(generate_library(songs, seed=args.seed))
+        results[str(songs)] = run_workload(library, iterations=args.iterations)
+        report(songs, results[str(songs)])
+        regressions.extend(
+            (songs,) + regression
+            for regression in compare(
+                results[str(songs)],
+                baseline.get(str(songs), {}),
+                tolerance=args.tolerance,
+            )
+        )
+
+    if args.save is not None:
+        with open(args.save, "w") as f:
+            json.dump(
+                {"seed": args.seed, "iterations": args.iterations, "results": results},
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+
+    for songs, name, metric, before, after in regressions:
+        print(
+            "regression: {} songs {} {} {:.6g} -> {:.6g}".format(
+                songs, name, metric, before, after
+            )
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
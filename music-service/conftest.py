@@ -1,3 +1,4 @@
+import json
 from os import path
 
 from pytest import fixture
@@ -29,12 +30,18 @@ class MusicmanagerMock(GoogleMusicClientMock):
     def login(self, *args, **kwargs):
         pass
 
+    def upload(self, filepaths, **kwargs):
+        return {path: "server-" + path for path in filepaths}, {}, {}
+
 
 @fixture
-def app(monkeypatch):
+def app(monkeypatch, tmp_path):
     app = create_app(
         {
             "TESTING": True,
+            "LIBRARY_SNAPSHOT_DIR": str(tmp_path / "libraries"),
+            "ALBUM_ART_DIR": str(tmp_path / "art"),
+            "ALBUM_ART_HOSTS": ("127.0.0.1", "art.example"),
             "MOBILE_CREDENTIALS": path.join(
                 path.dirname(__file__), "mobile_credentials.cred"
             ),
@@ -50,3 +57,21 @@ def app(monkeypatch):
     monkeypatch.setattr("gmusicapi.Musicmanager", MusicmanagerMock)
 
     return app
+
+
+@fixture
+def credentials():
+    def credentials(refresh_token="token"):
+        return json.dumps(
+            {
+                "accessToken": "",
+                "clientId": "",
+                "clientSecret": "",
+                "refreshToken": refresh_token,
+                "tokenExpiry": 0,
+                "tokenUri": "",
+                "userAgent": "",
+            }
+        )
+
+    return credentials
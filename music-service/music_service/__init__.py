@@ -1,15 +1,40 @@
+import importlib
 import os
 
 from flask import Flask
-from flask_graphql import GraphQLView
 
 from . import db, schema
+from .art import DEFAULT_HOSTS, DEFAULT_MAX_BYTES, DEFAULT_SIZES, ArtCache
+from .cache import LRUCache
+from .cost import DEFAULT_MAX_COST, DEFAULT_MAX_DEPTH, QueryCost
+from .documents import DocumentCache, PersistedQueries
+from .metrics import Metrics
+from .tokens import TokenManager
+from .upload import Uploader
+from .view import MusicGraphQLView, album_art, metrics
+
+DEFAULT_SECRET_KEY = "dev"
+UPSTREAM_MODULES = (
+    "gmusicapi",
+    "gmusicapi.protocol.musicmanager",
+    "oauth2client.client",
+    "mutagen",
+    "requests",
+    "PIL.Image",
+)
+
+
+def warm_up(upstream=True):
+    schema.get_schema()
+    if upstream:
+        for name in UPSTREAM_MODULES:
+            importlib.import_module(name)
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__, instance_relative_config=True)
-    app.config.from_mapping(SECRET_KEY="dev")
+    app.config.from_mapping(SECRET_KEY=DEFAULT_SECRET_KEY)
 
     # load the instance config, if it exists
     app.config.from_mapping(
@@ -36,10 +61,72 @@ def create_app(test_config=None):
     except OSError:
         pass
 
+    app.extensions["metrics"] = Metrics()
     db.init_app(app)
+    app.extensions["oauth_tokens"] = TokenManager(
+        refresh_ahead=app.config.get("TOKEN_REFRESH_AHEAD", 300),
+        workers=app.config.get("TOKEN_REFRESH_WORKERS", 2),
+    )
+    app.extensions["graphql_backend"] = DocumentCache(
+        app.config.get("GRAPHQL_DOCUMENT_CACHE_SIZE", 256)
+    )
+    app.extensions["uploader"] = Uploader(
+        app.config.get("UPLOAD_DIRECTORY", None),
+        workers=app.config.get("UPLOAD_WORKERS", 4),
+    )
+    art_secret = album_art_secret(app)
+    app.extensions["album_art"] = (
+        ArtCache(
+            app.config.get("ALBUM_ART_DIR", os.path.join(app.instance_path, "art")),
+            art_secret,
+            sizes=app.config.get("ALBUM_ART_SIZES", DEFAULT_SIZES),
+            hosts=app.config.get("ALBUM_ART_HOSTS", DEFAULT_HOSTS),
+            max_bytes=app.config.get("ALBUM_ART_CACHE_BYTES", DEFAULT_MAX_BYTES),
+            metrics=app.extensions["metrics"],
+        )
+        if art_secret is not None
+        else None
+    )
+    app.extensions["query_cost"] = QueryCost(
+        max_cost=app.config.get("GRAPHQL_MAX_COST", DEFAULT_MAX_COST),
+        max_depth=app.config.get("GRAPHQL_MAX_DEPTH", DEFAULT_MAX_DEPTH),
+    )
     app.add_url_rule(
         "/graphql",
-        view_func=GraphQLView.as_view("graphql", schema=schema.schema, graphiql=True),
+        view_func=MusicGraphQLView.as_view(
+            "graphql",
+            graphiql=True,
+            batch=True,
+            backend=app.extensions["graphql_backend"],
+            persisted_queries=PersistedQueries(
+                app.config.get("PERSISTED_QUERY_CACHE_SIZE", 1024)
+            ),
+            response_cache=LRUCache(
+                ttl=None, max_entries=app.config.get("RESPONSE_CACHE_SIZE", 256)
+            ),
+            metrics=app.extensions["metrics"],
+            query_cost=app.extensions["query_cost"],
+        ),
     )
+    app.add_url_rule("/metrics", view_func=metrics)
+    if app.extensions["album_art"] is not None:
+        app.add_url_rule("/art/<album>", view_func=album_art)
+    else:
+        app.logger.warning(
+            "Album art is disabled; set ALBUM_ART_SECRET or SECRET_KEY to enable it."
+        )
+
+    if app.config.get("WARM_UP", False):
+        warm_up()
 
     return app
+
+
+def album_art_secret(app):
+    secret = app.config.get("ALBUM_ART_SECRET")
+    if secret:
+        return secret
+    if app.config["SECRET_KEY"] != DEFAULT_SECRET_KEY or app.testing:
+        return app.config["SECRET_KEY"]
+
+    return None
@@ -0,0 +1,229 @@
+import hashlib
+import io
+import os
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+from urllib.parse import urlsplit
+
+from itsdangerous import BadSignature, URLSafeSerializer
+
+DEFAULT_SIZES = (64, 128, 256, 512)
+DEFAULT_HOSTS = ("googleusercontent.com", "ggpht.com")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+LOCK_STRIPES = 64
+
+
+class ArtError(Exception):
+    pass
+
+
+class ArtUnavailable(Exception):
+    pass
+
+
+class ArtCache:
+    def __init__(
+        self,
+        directory,
+        secret_key,
+        sizes=DEFAULT_SIZES,
+        hosts=DEFAULT_HOSTS,
+        max_bytes=DEFAULT_MAX_BYTES,
+        timeout=10,
+        metrics=None,
+    ):
+        self.directory = directory
+        self.sizes = tuple(sorted(sizes))
+        self.hosts = tuple(host.lower() for host in hosts)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.serializer = URLSafeSerializer(secret_key, salt="album-art")
+        self.fetch_timer = (
+            metrics.histogram(
+                "music_service_upstream_seconds",
+                "Time spent in Google Play Music API calls.",
+            )
+            if metrics is not None
+            else None
+        )
+
+        self._files = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+        self._stripes = [Lock() for _ in range(LOCK_STRIPES)]
+
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def url(self, art_url, size=None):
+        path = "/art/{}".format(self.serializer.dumps(art_url))
+        if size is None:
+            return path
+
+        return "{}?size={}".format(path, self.size(size))
+
+    def size(self, requested):
+        return next((size for size in self.sizes if size >= requested), self.sizes[-1])
+
+    def get(self, token, size=None):
+        try:
+            art_url = self.serializer.loads(token)
+        except BadSignature:
+            raise ArtError("Unknown album art.")
+        if size is not None and size not in self.sizes:
+            raise ArtError("Unsupported album art size {}.".format(size))
+        if not self.allows(art_url):
+            raise ArtError("Album art host is not allowed.")
+
+        key = hashlib.sha256(art_url.encode("utf-8")).hexdigest()
+        name = key if size is None else "{}-{}".format(key, size)
+        data = self._read(name)
+        if data is None:
+            with self._stripe(key):
+                data = self._read(name)
+                if data is None:
+                    data = self._original(key, art_url)
+                    if size is not None:
+                        data = thumbnail(data, size)
+                        self._store(name, data)
+
+        return data, "image/jpeg" if size is not None else mimetype(data)
+
+    def allows(self, art_url):
+        try:
+            url = urlsplit(art_url)
+            host = (url.hostname or "").lower()
+        except (AttributeError, ValueError):
+            return False
+        if url.scheme not in ("http", "https") or not host:
+            return False
+
+        return any(
+            host == allowed or host.endswith("." + allowed) for allowed in self.hosts
+        )
+
+    def _original(self, key, art_url):
+        data = self._read(key)
+        if data is None:
+            data = self._fetch(art_url)
+            mimetype(data)
+            self._store(key, data)
+
+        return data
+
+    def _fetch(self, art_url):
+        import requests
+
+        try:
+            if self.fetch_timer is None:
+                response = requests.get(
+                    art_url, timeout=self.timeout, allow_redirects=False
+                )
+            else:
+                with self.fetch_timer.time(call="album_art"):
+                    response = requests.get(
+                        art_url, timeout=self.timeout, allow_redirects=False
+                    )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise ArtUnavailable(str(e))
+        if response.status_code != 200:
+            raise ArtUnavailable(
+                "Album art answered {} for {}".format(response.status_code, art_url)
+            )
+
+        return response.content
+
+    def _stripe(self, name):
+        return self._stripes[int(name[:8], 16) % LOCK_STRIPES]
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _scan(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = self._path(name)
+            if name.endswith(".tmp"):
+                os.unlink(path)
+            elif os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size))
+
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self._bytes += size
+        self._evict()
+
+    def _read(self, name):
+        with self._lock:
+            if name not in self._files:
+                return None
+            self._files.move_to_end(name)
+
+        try:
+            with open(self._path(name), "rb") as f:
+                data = f.read()
+            os.utime(self._path(name))
+        except OSError:
+            with self._lock:
+                self._bytes -= self._files.pop(name, 0)
+            return None
+
+        return data
+
+    def _store(self, name, data):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, self._path(name))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        with self._lock:
+            self._bytes += len(data) - self._files.pop(name, 0)
+            self._files[name] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            self._bytes -= size
+            try:
+                os.unlink(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    def __len__(self):
+        with self._lock:
+            return len(self._files)
+
+
+def thumbnail(data, size):
+    from PIL import Image
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.thumbnail((size, size), Image.LANCZOS)
+    except (OSError, Image.DecompressionBombError):
+        raise ArtError("Album art is not a readable image.")
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=85, optimize=True)
+    return output.getvalue()
+
+
+def mimetype(data):
+    from PIL import Image
+
+    try:
+        image = Image.open(io.BytesIO(data))
+    except (OSError, Image.DecompressionBombError):
+        raise ArtError("Album art is not a readable image.")
+
+    return image.get_format_mimetype()
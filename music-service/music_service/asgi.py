@@ -0,0 +1,323 @@
+import asyncio
+import io
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from graphql.execution import ExecutionResult
+from graphql.execution.executors.asyncio import AsyncioExecutor
+from graphql.utils.get_operation_ast import get_operation_ast
+from graphql_server import (
+    HttpQueryError,
+    default_format_error,
+    encode_execution_results,
+    json_encode,
+)
+from werkzeug.datastructures import Headers
+
+from . import create_app, db, schema
+from .cost import QueryCostError
+from .loaders import Loaders
+from .metrics import ResolverTimer, Trace
+from .view import batch_error, resolver_histogram
+
+
+class AsyncGraphQLApp:
+    def __init__(self, app):
+        self.app = app
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config.get("UPSTREAM_WORKERS", 8)
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] != "http":
+            raise ValueError("Unsupported scope type {!r}".format(scope["type"]))
+        elif scope["path"] != "/graphql":
+            await self.forward(scope, await read_body(receive), send)
+        else:
+            try:
+                status, body = await self.execute(scope, await read_body(receive))
+            except HttpQueryError as e:
+                status, body = e.status_code, {"errors": [default_format_error(e)]}
+            await respond(send, status, body)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def forward(self, scope, body, send):
+        loop = asyncio.get_running_loop()
+        status, headers, content = await loop.run_in_executor(
+            self.executor, call_wsgi, self.app, wsgi_environ(scope, body)
+        )
+        await send(
+            {"type": "http.response.start", "status": status, "headers": headers}
+        )
+        await send({"type": "http.response.body", "body": content})
+
+    async def execute(self, scope, body):
+        if scope["method"] == "GET":
+            data = {
+                key: values[0]
+                for key, values in parse_qs(scope["query_string"].decode()).items()
+            }
+        elif scope["method"] == "POST":
+            try:
+                data = json.loads(body or b"{}")
+            except ValueError:
+                raise HttpQueryError(400, "POST body sent invalid JSON.")
+        else:
+            raise HttpQueryError(405, "GraphQL only supports GET and POST requests.")
+
+        batched = isinstance(data, list)
+        if not batched:
+            data = [data]
+        elif not data:
+            raise HttpQueryError(400, "Received an empty list in the batch request.")
+
+        headers = Headers(
+            [
+                (key.decode("latin-1"), value.decode("latin-1"))
+                for key, value in scope["headers"]
+            ]
+        )
+        trace = Trace() if headers.get("X-GraphQL-Trace") else None
+        library = db.cached_library(self.app, headers)
+        operations = [Operation(params) for params in data]
+        for operation in operations:
+            operation.prepare(self.app, library)
+
+        if batched:
+            errors = [
+                batch_error(index, operation.error)
+                for index, operation in enumerate(operations)
+                if isinstance(operation.error, QueryCostError)
+            ]
+            costs = [operation.cost for operation in operations]
+            try:
+                if not errors:
+                    self.app.extensions["query_cost"].check_total(costs)
+            except QueryCostError as e:
+                errors.append(e)
+            if errors:
+                return (
+                    400,
+                    {
+                        "errors": [default_format_error(e) for e in errors],
+                        "extensions": {"cost": costs},
+                    },
+                )
+
+        pending = [operation for operation in operations if operation.result is None]
+        if pending:
+            results = await self.execute_documents(pending, headers, trace)
+            for operation, result in zip(pending, results):
+                operation.result = result
+
+        body, status = encode_execution_results(
+            [operation.result for operation in operations],
+            is_batch=batched,
+            format_error=default_format_error,
+            encode=lambda data: data,
+        )
+        if not batched:
+            return status, operations[0].add_extensions(body, trace, None)
+
+        return (
+            status,
+            [
+                operation.add_extensions(result, trace, operation.operation_ast)
+                for operation, result in zip(operations, body)
+            ],
+        )
+
+    async def execute_documents(self, operations, headers, trace=None):
+        loop = asyncio.get_running_loop()
+        try:
+            database = await loop.run_in_executor(
+                self.executor, db.open_db, self.app, headers
+            )
+        except (KeyError, ValueError) as e:
+            return [ExecutionResult(errors=[e], invalid=True)] * len(operations)
+        except Exception as e:
+            return [ExecutionResult(errors=[e])] * len(operations)
+
+        try:
+            library = await loop.run_in_executor(self.executor, database.get_library)
+        except Exception as e:
+            return [ExecutionResult(errors=[e])] * len(operations)
+        finally:
+            await loop.run_in_executor(
+                self.executor, self.app.extensions["session_pool"].release, database
+            )
+
+        context = {
+            "loaders": Loaders(lambda ready: library),
+            "album_art": self.app.extensions["album_art"],
+        }
+        middleware = ResolverTimer(
+            resolver_histogram(self.app.extensions["metrics"]), trace
+        ).middleware()
+        return [
+            await operation.document.execute(
+                variable_values=operation.variables,
+                operation_name=operation.operation_name,
+                context_value=context,
+                middleware=middleware,
+                executor=AsyncioExecutor(loop),
+                return_promise=True,
+            )
+            for operation in operations
+        ]
+
+
+class Operation:
+    def __init__(self, params):
+        if not isinstance(params, dict) or not params.get("query"):
+            raise HttpQueryError(400, "Must provide query string.")
+        variables = params.get("variables")
+        if isinstance(variables, str):
+            try:
+                variables = json.loads(variables)
+            except ValueError:
+                raise HttpQueryError(400, "Variables are invalid JSON.")
+
+        self.query = params["query"]
+        self.variables = variables
+        self.operation_name = params.get("operationName")
+        self.document = None
+        self.cost = None
+        self.error = None
+        self.result = None
+
+    @property
+    def operation_ast(self):
+        if self.document is None or self.document.errors:
+            return None
+
+        return get_operation_ast(self.document.document_ast, self.operation_name)
+
+    def prepare(self, app, library):
+        try:
+            self.document = app.extensions["graphql_backend"].document_from_string(
+                schema.get_schema(), self.query
+            )
+            if self.document.errors:
+                self.fail(*self.document.errors)
+                return
+            self.cost = app.extensions["query_cost"].check(
+                schema.get_schema(),
+                self.document.document_ast,
+                self.variables,
+                self.operation_name,
+                library,
+            )
+        except QueryCostError as e:
+            self.cost = e.cost
+            self.fail(e)
+        except Exception as e:
+            self.fail(e)
+
+    def fail(self, *errors):
+        self.error = errors[0]
+        self.result = ExecutionResult(errors=list(errors), invalid=True)
+
+    def add_extensions(self, body, trace, operation_ast):
+        extensions = {}
+        if self.cost is not None:
+            extensions["cost"] = self.cost
+        if trace is not None:
+            extensions["tracing"] = trace.to_dict(operation_ast)
+        if not extensions:
+            return body
+
+        return dict(body, extensions=extensions)
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+
+async def respond(send, status, body):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    await send({"type": "http.response.body", "body": json_encode(body).encode()})
+
+
+def wsgi_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/{}".format(scope.get("http_version", "1.1")),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+
+    for key, value in scope["headers"]:
+        key = key.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[key] = value
+            continue
+        key = "HTTP_" + key
+        environ[key] = environ[key] + "," + value if key in environ else value
+
+    return environ
+
+
+def call_wsgi(app, environ):
+    response = []
+
+    def start_response(status, headers, exc_info=None):
+        response[:] = [
+            int(status.split(" ", 1)[0]),
+            [
+                (key.lower().encode("latin-1"), value.encode("latin-1"))
+                for key, value in headers
+            ],
+        ]
+
+    result = app(environ, start_response)
+    try:
+        content = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+
+    return response[0], response[1], content
+
+
+def create_asgi_app(test_config=None):
+    return AsyncGraphQLApp(create_app(test_config))
@@ -0,0 +1,64 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    def __init__(self, ttl=300, max_entries=64, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+
+            value, stored_at = self._entries[key]
+            if self.ttl is not None and self.clock() - stored_at >= self.ttl:
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def peek(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+
+            value, _ = self._entries[key]
+            return value
+
+    def age(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+
+            _, stored_at = self._entries[key]
+            return self.clock() - stored_at
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, self.clock())
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
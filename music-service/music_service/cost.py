@@ -0,0 +1,208 @@
+from math import ceil
+
+from graphql import GraphQLError
+from graphql.language import ast
+from graphql.type import GraphQLList, GraphQLNonNull
+
+DEFAULT_MAX_COST = 1000000
+DEFAULT_MAX_DEPTH = 10
+
+DEFAULT_SONGS = 5000
+DEFAULT_ALBUMS = 400
+DEFAULT_ARTISTS = 150
+
+
+class QueryCostError(GraphQLError):
+    def __init__(self, message, cost):
+        super().__init__(message)
+        self.cost = cost
+
+
+class QueryCost:
+    def __init__(self, max_cost=DEFAULT_MAX_COST, max_depth=DEFAULT_MAX_DEPTH):
+        self.max_cost = max_cost
+        self.max_depth = max_depth
+
+    def check(
+        self, schema, document_ast, variables=None, operation_name=None, library=None
+    ):
+        cost, depth = analyze(
+            schema,
+            document_ast,
+            variables or {},
+            operation_name,
+            cardinalities(library),
+        )
+        result = {"requested": cost, "maximum": self.max_cost, "depth": depth}
+
+        if self.max_depth is not None and depth > self.max_depth:
+            raise QueryCostError(
+                "Query depth {} exceeds the maximum depth of {}.".format(
+                    depth, self.max_depth
+                ),
+                result,
+            )
+        if self.max_cost is not None and cost > self.max_cost:
+            raise QueryCostError(
+                "Query cost {} exceeds the maximum cost of {}. Request fewer items "
+                "with `first` or select fewer nested lists.".format(
+                    cost, self.max_cost
+                ),
+                result,
+            )
+
+        return result
+
+    def check_total(self, costs):
+        total = sum(cost["requested"] for cost in costs if cost is not None)
+        if self.max_cost is not None and total > self.max_cost:
+            raise QueryCostError(
+                "Batch cost {} exceeds the maximum cost of {}. Split the batch into "
+                "smaller requests.".format(total, self.max_cost),
+                {"requested": total, "maximum": self.max_cost},
+            )
+
+        return total
+
+
+def analyze(schema, document_ast, variables, operation_name, sizes):
+    operation = None
+    fragments = {}
+    for definition in document_ast.definitions:
+        if isinstance(definition, ast.FragmentDefinition):
+            fragments[definition.name.value] = definition
+        elif isinstance(definition, ast.OperationDefinition):
+            if operation_name is None or (
+                definition.name is not None and definition.name.value == operation_name
+            ):
+                operation = operation or definition
+
+    if operation is None:
+        return 0, 0
+    if operation.operation == "mutation":
+        root = schema.get_mutation_type()
+    else:
+        root = schema.get_query_type()
+    if root is None:
+        return 0, 0
+
+    return CostAnalysis(schema, fragments, variables, sizes).selection_set(
+        root, operation.selection_set, 0, None
+    )
+
+
+class CostAnalysis:
+    def __init__(self, schema, fragments, variables, sizes):
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables
+        self.sizes = sizes
+
+    def selection_set(self, parent_type, selection_set, depth, connection_size):
+        cost = 0
+        deepest = depth
+        for field_parent, field in self.fields(parent_type, selection_set):
+            name = field.name.value
+            definition = field_parent.fields.get(name)
+            if name.startswith("__") or definition is None:
+                continue
+
+            key = "{}.{}".format(field_parent.name, name)
+            first = self.argument(field, "first")
+            field_type = definition.type
+            if isinstance(field_type, GraphQLNonNull):
+                field_type = field_type.of_type
+
+            if isinstance(field_type, GraphQLList):
+                if name == "edges" and connection_size is not None:
+                    size = connection_size
+                else:
+                    size = self.sizes.get(key, 1)
+                multiplier = size if first is None else min(first, size)
+                child_connection = None
+            else:
+                multiplier = 1
+                child_connection = self.sizes.get(key)
+                if child_connection is not None and first is not None:
+                    child_connection = min(first, child_connection)
+
+            if field.selection_set is None:
+                cost += multiplier
+                deepest = max(deepest, depth + 1)
+                continue
+
+            child_cost, child_depth = self.selection_set(
+                named_type(field_type),
+                field.selection_set,
+                depth + 1,
+                child_connection,
+            )
+            cost += 1 + multiplier * child_cost
+            deepest = max(deepest, child_depth)
+
+        return cost, deepest
+
+    def fields(self, parent_type, selection_set):
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field):
+                yield parent_type, selection
+            elif isinstance(selection, ast.FragmentSpread):
+                fragment = self.fragments.get(selection.name.value)
+                if fragment is not None:
+                    yield from self.fields(
+                        self.condition_type(parent_type, fragment),
+                        fragment.selection_set,
+                    )
+            elif isinstance(selection, ast.InlineFragment):
+                yield from self.fields(
+                    self.condition_type(parent_type, selection),
+                    selection.selection_set,
+                )
+
+    def condition_type(self, parent_type, fragment):
+        if fragment.type_condition is None:
+            return parent_type
+
+        return self.schema.get_type(fragment.type_condition.name.value) or parent_type
+
+    def argument(self, field, name):
+        for argument in field.arguments or ():
+            if argument.name.value != name:
+                continue
+
+            value = argument.value
+            if isinstance(value, ast.IntValue):
+                return max(int(value.value), 0)
+            if isinstance(value, ast.Variable):
+                value = self.variables.get(value.name.value)
+                if isinstance(value, int):
+                    return max(value, 0)
+
+        return None
+
+
+def named_type(field_type):
+    while isinstance(field_type, (GraphQLList, GraphQLNonNull)):
+        field_type = field_type.of_type
+
+    return field_type
+
+
+def cardinalities(library=None):
+    if library is None or not library.complete:
+        songs, albums, artists = DEFAULT_SONGS, DEFAULT_ALBUMS, DEFAULT_ARTISTS
+    else:
+        songs = len(library.songs)
+        albums = len(library.album_tracks)
+        artists = len(library.artist_albums)
+
+    return {
+        "RootQuery.songs": songs,
+        "RootQuery.songsConnection": songs,
+        "RootQuery.artists": artists,
+        "RootQuery.artistsConnection": artists,
+        "RootQuery.albums": albums,
+        "RootQuery.albumsConnection": albums,
+        "Album.tracks": ceil(songs / albums) if albums else 1,
+        "Artist.albums": ceil(albums / artists) if artists else 1,
+    }
@@ -1,12 +1,31 @@
+import hashlib
 import json
+import logging
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta, timezone
 from os import path
+from threading import BoundedSemaphore, Lock
 
-import gmusicapi
-import oauth2client
 from flask import current_app, g, request
 
+from .cache import LRUCache
+from .library import Library
+from .pool import SessionPool
+from .refresh import LibraryRefresher
+from .shared import SharedLibraryStore
+from .snapshot import SnapshotStore
+from .stream import LibraryStreams
+
+logger = logging.getLogger(__name__)
+
+EXPIRY_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
 
 class GoogleMusicDatabase:
+    sync_overlap = timedelta(minutes=1)
+
     def __init__(
         self,
         device_id,
@@ -14,13 +33,41 @@ class GoogleMusicDatabase:
         uploader_id=None,
         uploader_name=None,
         manager_credentials=None,
+        library_cache=None,
+        snapshots=None,
+        executor=None,
+        streams=None,
+        metrics=None,
+        refresher=None,
+        upstream_limit=None,
+        flights=None,
     ):
         self.device_id = device_id
         self.mobile_credentials = mobile_credentials
+        self.account = account_key(mobile_credentials)
+        self.library_cache = library_cache
+        self.snapshots = snapshots
+        self.executor = executor
+        self.streams = streams
+        self.metrics = metrics
+        self.refresher = refresher
+        self.upstream_limit = upstream_limit
+        self.flights = flights
+        self.upstream_timer = (
+            metrics.histogram(
+                "music_service_upstream_seconds",
+                "Time spent in Google Play Music API calls.",
+            )
+            if metrics is not None
+            else None
+        )
 
         self.uploader_id = uploader_id
         self.uploader_name = uploader_name
         self.manager_credentials = manager_credentials
+        self.session_key = session_key(mobile_credentials, manager_credentials)
+
+        import gmusicapi
 
         self.mobile_client = gmusicapi.Mobileclient()
         self.music_manager = gmusicapi.Musicmanager()
@@ -30,17 +77,27 @@ class GoogleMusicDatabase:
     def _login(self):
         if self.mobile_credentials is not None:
             if not self.mobile_client.is_authenticated():
-                self.mobile_client.oauth_login(
-                    self.device_id, oauth_credentials=self.mobile_credentials
-                )
+                with self._upstream("oauth_login"):
+                    self.mobile_client.oauth_login(
+                        self.device_id, oauth_credentials=self.mobile_credentials
+                    )
 
         if self.manager_credentials is not None:
             if not self.music_manager.is_authenticated():
-                self.music_manager.login(
-                    uploader_id=self.uploader_id,
-                    uploader_name=self.uploader_name,
-                    oauth_credentials=self.manager_credentials,
-                )
+                with self._upstream("login"):
+                    self.music_manager.login(
+                        uploader_id=self.uploader_id,
+                        uploader_name=self.uploader_name,
+                        oauth_credentials=self.manager_credentials,
+                    )
+
+    @contextmanager
+    def _upstream(self, call):
+        limit = self.upstream_limit
+        timer = self.upstream_timer
+        with limit if limit is not None else nullcontext():
+            with timer.time(call=call) if timer is not None else nullcontext():
+                yield
 
     def is_authenticated(self):
         return (
@@ -48,62 +105,384 @@ class GoogleMusicDatabase:
             and self.music_manager.is_authenticated()
         )
 
+    def is_ready(self):
+        return (
+            self.mobile_credentials is None or self.mobile_client.is_authenticated()
+        ) and (
+            self.manager_credentials is None or self.music_manager.is_authenticated()
+        )
+
+    def clone(self):
+        return GoogleMusicDatabase(
+            device_id=self.device_id,
+            mobile_credentials=self.mobile_credentials,
+            uploader_id=self.uploader_id,
+            uploader_name=self.uploader_name,
+            manager_credentials=self.manager_credentials,
+            library_cache=self.library_cache,
+            snapshots=self.snapshots,
+            executor=self.executor,
+            streams=self.streams,
+            metrics=self.metrics,
+            refresher=self.refresher,
+            upstream_limit=self.upstream_limit,
+            flights=self.flights,
+        )
+
+    def get_library(self, ready=None):
+        if getattr(self, "library", None) is None:
+            if self.library_cache is not None and self.account is not None:
+                library = self._load_library(ready)
+            else:
+                library = self._fetch_library()
+
+            if not library.complete:
+                return library
+            self.library = library
+
+        return self.library
+
+    def _load_library(self, ready=None):
+        library = self.library_cache.get(self.account)
+        if library is not None:
+            latest = (
+                self.snapshots.latest(self.account, library)
+                if self.snapshots is not None
+                else None
+            )
+            if latest is not None:
+                self.library_cache.set(self.account, latest)
+                return latest
+            if self.refresher is not None and self.refresher.is_stale(
+                self.library_cache.age(self.account)
+            ):
+                self.refresher.schedule(self.account, self._reconcile_library)
+            return library
+
+        stream = self.streams.get(self.account) if self.streams is not None else None
+        if stream is not None:
+            return stream.wait(ready)
+
+        library = self.library_cache.peek(self.account)
+        if library is None and self.snapshots is not None:
+            library = self._single_flight("snapshot", self._restore_snapshot)
+            if library is not None:
+                return library
+
+        if library is None and self.streams is not None:
+            stream = self.streams.start(
+                self.account, datetime.now(timezone.utc), self._stream_library
+            )
+            return stream.wait(ready)
+
+        return self._single_flight("sync", lambda: self._update_library(library))
+
+    def _single_flight(self, kind, function):
+        if self.flights is None:
+            return function()
+
+        return self.flights.do((kind, self.account), function)
+
+    def _restore_snapshot(self):
+        library = self.library_cache.get(self.account)
+        if library is not None:
+            return library
+
+        library = self.snapshots.load(self.account)
+        if library is not None:
+            self.library_cache.set(self.account, library)
+            if self._is_stale(library):
+                self._refresh()
+        return library
+
+    def _update_library(self, library):
+        cached = self.library_cache.get(self.account)
+        if cached is not None:
+            return cached
+
+        library = self._sync_library(library)
+        self.library_cache.set(self.account, library)
+        if self.snapshots is not None:
+            self._submit(self._save_snapshot, library)
+        return library
+
+    def _is_stale(self, library):
+        if self.refresher is None or library.synced_at is None:
+            return True
+
+        age = datetime.now(timezone.utc) - library.synced_at
+        return self.refresher.is_stale(age.total_seconds())
+
+    def _submit(self, function, *args):
+        future = self.executor.submit(function, *args)
+        future.add_done_callback(log_failure)
+        return future
+
+    def _refresh(self):
+        if self.refresher is not None:
+            self.refresher.schedule(self.account, self._reconcile_library)
+        else:
+            self._submit(self._reconcile_library)
+
+    def _reconcile_library(self):
+        session = self.clone()
+        try:
+            library = session._sync_library(self.library_cache.peek(self.account))
+        finally:
+            session.close()
+
+        self.library_cache.set(self.account, library)
+        if self.snapshots is not None:
+            self._save_snapshot(library)
+
+    def _save_snapshot(self, library):
+        self.snapshots.save(
+            self.account,
+            library,
+            current=lambda: self.library_cache.peek(self.account) is library,
+        )
+
+    def _stream_library(self, stream):
+        session = self.clone()
+        try:
+            pages = iter(session.mobile_client.get_all_songs(incremental=True))
+            while True:
+                with session._upstream("get_all_songs"):
+                    songs = next(pages, None)
+                if songs is None:
+                    break
+                stream.add(songs)
+        finally:
+            session.close()
+
+        library = stream.finish()
+        self.library_cache.set(self.account, library)
+        if self.snapshots is not None:
+            self._save_snapshot(library)
+
+    def _fetch_library(self):
+        synced_at = datetime.now(timezone.utc)
+        with self._upstream("get_all_songs"):
+            songs = self.mobile_client.get_all_songs()
+        return Library(songs, synced_at=synced_at)
+
+    def _sync_library(self, library):
+        if library is None or library.synced_at is None:
+            return self._fetch_library()
+
+        synced_at = datetime.now(timezone.utc)
+        with self._upstream("get_all_songs"):
+            changes = self.mobile_client.get_all_songs(
+                updated_after=library.synced_at - self.sync_overlap
+            )
+        return library.updated(changes, synced_at)
+
+    def upload(self, path):
+        with self._upstream("upload"):
+            return self.music_manager.upload([path], enable_matching=False)
+
     def get_songs(self):
-        if getattr(self, "songs", None) is None:
-            self.songs = self.mobile_client.get_all_songs()
+        return self.get_library().songs
+
+    def invalidate_songs(self):
+        self.library = None
+        if self.library_cache is not None and self.account is not None:
+            self.library_cache.invalidate(self.account)
+        if self.snapshots is not None and self.account is not None:
+            self.snapshots.delete(self.account)
 
-        return self.songs
+    def reset(self):
+        self.library = None
 
     def close(self):
-        self.mobile_client.logout()
-        self.music_manager.logout()
+        with self._upstream("logout"):
+            self.mobile_client.logout()
+            self.music_manager.logout()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = Lock()
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = [Future(), 0]
+            else:
+                call[1] += 1
+
+        future = call[0]
+        if not leader:
+            return future.result()
+
+        try:
+            result = function()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def waiters(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            return call[1] if call is not None else 0
+
+
+def log_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error("Background library task failed", exc_info=error)
 
 
 def get_db():
     if "db" not in g:
-        mobile_credentials = (
-            json_to_credentials(
-                json.loads(request.headers["Mobile-Client-Authorization"])
-            )
-            if "Mobile-Client-Authorization" in request.headers
-            else None
-        )
-        manager_credentials = (
-            json_to_credentials(
-                json.loads(request.headers["Music-Manager-Authorization"])
-            )
-            if "Music-Manager-Authorization" in request.headers
-            else None
-        )
-        g.db = GoogleMusicDatabase(
-            device_id=current_app.config["DEVICE_ID"],
+        g.db = open_db(current_app, request.headers)
+
+    return g.db
+
+
+def open_db(app, headers):
+    tokens = app.extensions.get("oauth_tokens")
+    mobile_credentials = header_credentials(
+        headers, "Mobile-Client-Authorization", tokens
+    )
+    manager_credentials = header_credentials(
+        headers, "Music-Manager-Authorization", tokens
+    )
+    key = session_key(mobile_credentials, manager_credentials)
+    db = app.extensions["session_pool"].acquire(key) if key is not None else None
+    if db is None:
+        db = GoogleMusicDatabase(
+            device_id=app.config["DEVICE_ID"],
             mobile_credentials=mobile_credentials,
-            uploader_id=current_app.config.get("UPLOADER_ID", None),
-            uploader_name=current_app.config.get("UPLOADER_NAME", None),
+            uploader_id=app.config.get("UPLOADER_ID", None),
+            uploader_name=app.config.get("UPLOADER_NAME", None),
             manager_credentials=manager_credentials,
+            library_cache=app.extensions["library_cache"],
+            snapshots=app.extensions["library_snapshots"],
+            executor=app.extensions["library_executor"],
+            streams=app.extensions["library_streams"],
+            metrics=app.extensions["metrics"],
+            refresher=app.extensions["library_refresher"],
+            upstream_limit=app.extensions["upstream_limit"],
+            flights=app.extensions["library_flights"],
         )
 
-    return g.db
+    return db
+
+
+def cached_library(app, headers):
+    try:
+        account = account_key(
+            header_credentials(headers, "Mobile-Client-Authorization")
+        )
+    except (KeyError, ValueError):
+        return None
+    if account is None:
+        return None
+
+    return app.extensions["library_cache"].peek(account)
 
 
 def close_db(e=None):
     db = g.pop("db", None)
 
     if db is not None:
-        db.close()
+        current_app.extensions["session_pool"].release(db)
 
 
 def init_app(app):
+    app.extensions["library_cache"] = LRUCache(
+        ttl=app.config.get("LIBRARY_CACHE_TTL", 300),
+        max_entries=app.config.get("LIBRARY_CACHE_SIZE", 64),
+    )
+    snapshot_dir = app.config.get(
+        "LIBRARY_SNAPSHOT_DIR", os.path.join(app.instance_path, "libraries")
+    )
+    os.makedirs(snapshot_dir, exist_ok=True)
+    app.extensions["library_snapshots"] = (
+        SharedLibraryStore(snapshot_dir)
+        if app.config.get("LIBRARY_SHARED_STORE", False)
+        else SnapshotStore(snapshot_dir)
+    )
+    app.extensions["library_executor"] = ThreadPoolExecutor(
+        max_workers=app.config.get("LIBRARY_SYNC_WORKERS", 2)
+    )
+    app.extensions["library_streams"] = (
+        LibraryStreams(app.extensions["library_executor"])
+        if app.config.get("LIBRARY_STREAMING", False)
+        else None
+    )
+    app.extensions["library_refresher"] = LibraryRefresher(
+        soft_ttl=app.config.get("LIBRARY_CACHE_SOFT_TTL", 60),
+        workers=app.config.get("LIBRARY_REFRESH_WORKERS", 2),
+    )
+    app.extensions["library_flights"] = SingleFlight()
+    app.extensions["upstream_limit"] = BoundedSemaphore(
+        app.config.get("UPSTREAM_CONCURRENCY", 4)
+    )
+    app.extensions["session_pool"] = SessionPool(
+        idle_timeout=app.config.get("SESSION_IDLE_TIMEOUT", 600),
+        max_per_account=app.config.get("SESSION_POOL_SIZE", 2),
+    )
     app.teardown_appcontext(close_db)
 
 
+def account_key(credentials):
+    if credentials is None or not credentials.refresh_token:
+        return None
+
+    return hashlib.sha256(credentials.refresh_token.encode("utf-8")).hexdigest()
+
+
+def session_key(mobile_credentials, manager_credentials):
+    key = (account_key(mobile_credentials), account_key(manager_credentials))
+    if key == (None, None):
+        return None
+
+    return key
+
+
+def header_credentials(headers, name, tokens=None):
+    if name not in headers:
+        return None
+
+    credentials = json_to_credentials(json.loads(headers[name]))
+    return tokens.manage(credentials) if tokens is not None else credentials
+
+
 def json_to_credentials(json):
-    return oauth2client.client.OAuth2Credentials(
+    from oauth2client.client import OAuth2Credentials
+
+    return OAuth2Credentials(
         access_token=json["accessToken"],
         client_id=json["clientId"],
         client_secret=json["clientSecret"],
         refresh_token=json["refreshToken"],
-        token_expiry=json["tokenExpiry"],
+        token_expiry=parse_expiry(json["tokenExpiry"]),
         token_uri=json["tokenUri"],
         user_agent=json["userAgent"],
     )
+
+
+def parse_expiry(value):
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value, EXPIRY_FORMAT)
+        except ValueError:
+            return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+        try:
+            return datetime.utcfromtimestamp(value / 1000)
+        except (OverflowError, OSError, ValueError):
+            return None
+
+    return value if isinstance(value, datetime) else None
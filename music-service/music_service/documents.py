@@ -0,0 +1,100 @@
+import hashlib
+from collections import OrderedDict
+from functools import partial
+from threading import Lock
+
+from graphql import parse, print_ast, validate
+from graphql.backend import GraphQLBackend, GraphQLDocument
+from graphql.execution import ExecutionResult, execute
+from graphql.pyutils.cached_property import cached_property
+from graphql_server import HttpQueryError
+
+
+class DocumentCache(GraphQLBackend):
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+
+        self._documents = OrderedDict()
+        self._lock = Lock()
+
+    def document_from_string(self, schema, document_string):
+        key = (id(schema), query_hash(document_string))
+        with self._lock:
+            if key in self._documents:
+                self._documents.move_to_end(key)
+                return self._documents[key]
+
+        document_ast = parse(document_string)
+        errors = validate(schema, document_ast)
+        document = CachedDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=partial(execute_validated, schema, document_ast, errors),
+        )
+        document.errors = errors
+
+        with self._lock:
+            self._documents[key] = document
+            while len(self._documents) > self.max_entries:
+                self._documents.popitem(last=False)
+
+        return document
+
+    def __len__(self):
+        with self._lock:
+            return len(self._documents)
+
+
+class CachedDocument(GraphQLDocument):
+    @cached_property
+    def normalized(self):
+        return print_ast(self.document_ast)
+
+
+class PersistedQueries:
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+
+        self._queries = OrderedDict()
+        self._lock = Lock()
+
+    def resolve(self, params):
+        persisted_query = (params.get("extensions") or {}).get("persistedQuery")
+        if persisted_query is None:
+            return params
+
+        if persisted_query.get("version", 1) != 1:
+            raise HttpQueryError(400, "Unsupported persisted query version.")
+        sha256_hash = persisted_query.get("sha256Hash")
+        query = params.get("query")
+
+        with self._lock:
+            if query:
+                if query_hash(query) != sha256_hash:
+                    raise HttpQueryError(400, "provided sha does not match query")
+                self._queries[sha256_hash] = query
+                self._queries.move_to_end(sha256_hash)
+                while len(self._queries) > self.max_entries:
+                    self._queries.popitem(last=False)
+                return params
+
+            if sha256_hash not in self._queries:
+                raise HttpQueryError(200, "PersistedQueryNotFound")
+            self._queries.move_to_end(sha256_hash)
+            return dict(params, query=self._queries[sha256_hash])
+
+    def __contains__(self, sha256_hash):
+        with self._lock:
+            return sha256_hash in self._queries
+
+
+def execute_validated(schema, document_ast, errors, *args, **kwargs):
+    if errors:
+        return ExecutionResult(errors=errors, invalid=True)
+
+    return execute(schema, document_ast, *args, **kwargs)
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
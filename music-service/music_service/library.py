@@ -0,0 +1,332 @@
+import heapq
+from array import array
+from collections import Counter
+
+from .store import MISSING, SongStore
+
+SEARCH_FIELDS = ("title", "artist", "albumArtist", "album")
+TOP_K_RATIO = 8
+
+
+class Library:
+    def __init__(self, songs, synced_at=None, complete=True):
+        self.songs = songs if isinstance(songs, SongStore) else SongStore(songs)
+        self.synced_at = synced_at
+        self.complete = complete
+        self._version = None
+        self._search_indexes = {}
+        self._song_order = None
+        self._artist_order = None
+        self._album_order = None
+        self._orders = {}
+
+        self.album_tracks = {}
+        self.artist_albums = {}
+        album_artists = {}
+        track_counts = {}
+        disc_counts = {}
+        art_urls = {}
+
+        store = self.songs
+        for position, album in enumerate(store.strings["album"]):
+            if album is None:
+                continue
+
+            self.album_tracks.setdefault(album, []).append(position)
+
+            album_artist = store.strings["albumArtist"][position]
+            if album_artist is not None and album_artist != "":
+                album_artists.setdefault(album, Counter())[album_artist] += 1
+                if album != "" and store.strings["artist"][position] is not None:
+                    self.artist_albums.setdefault(album_artist, {})[album] = None
+
+            track_count = store.integers["totalTrackCount"][position]
+            if track_count != MISSING:
+                track_counts.setdefault(album, Counter())[track_count] += 1
+            disc_count = store.integers["totalDiscCount"][position]
+            if disc_count != MISSING:
+                disc_counts.setdefault(album, Counter())[disc_count] += 1
+            for url in store.art_urls[position] or ():
+                if url != "":
+                    art_urls.setdefault(album, Counter())[url] += 1
+
+        self.album_artist = most_common(album_artists)
+        self.album_track_count = most_common(track_counts)
+        self.album_disc_count = most_common(disc_counts)
+        self.album_art_url = most_common(art_urls)
+        self.album_tracks = {
+            album: array("i", positions)
+            for album, positions in self.album_tracks.items()
+        }
+        self.artist_albums = {
+            artist: list(albums) for artist, albums in self.artist_albums.items()
+        }
+
+    @property
+    def version(self):
+        if self._version is None:
+            self._version = self.songs.digest()
+
+        return self._version
+
+    def updated(self, changes, synced_at):
+        changes = {song["id"]: song for song in changes}
+        songs = [changes.pop(song["id"], song) for song in self.songs]
+        songs.extend(changes.values())
+
+        return Library(songs, synced_at=synced_at)
+
+    def tracks(self, album):
+        return [self.songs[position] for position in self.album_tracks.get(album, ())]
+
+    def albums(self, artist):
+        return self.artist_albums.get(artist, [])
+
+    def find(self, search="", **fields):
+        positions = self.match(search=search, **fields)
+        if positions is None:
+            return self.songs
+        return [self.songs[position] for position in sorted(positions)]
+
+    def match(self, search="", **fields):
+        positions = None
+        for field, query in fields.items():
+            if query != "":
+                positions = intersect(positions, self.search_index(field).find(query))
+
+        if search != "":
+            matches = set()
+            for field in SEARCH_FIELDS:
+                matches |= self.search_index(field).find(search)
+            positions = intersect(positions, matches)
+
+        return positions
+
+    def song_keys(self, search="", title=""):
+        positions = self.match(search=search, title=title)
+        if positions is None:
+            if self._song_order is None:
+                self._song_order = sorted(
+                    (title, position)
+                    for position, title in enumerate(self.songs.strings["title"])
+                )
+            return self._song_order
+
+        titles = self.songs.strings["title"]
+        return sorted((titles[position], position) for position in positions)
+
+    def artist_names(self, search="", name=""):
+        positions = self.match(search=search, albumArtist=name)
+        if positions is None:
+            if self._artist_order is None:
+                self._artist_order = self._sorted_values("albumArtist")
+            return self._artist_order
+
+        return self._sorted_values("albumArtist", positions)
+
+    def album_names(self, search="", name=""):
+        positions = self.match(search=search, album=name)
+        if positions is None:
+            if self._album_order is None:
+                self._album_order = self._sorted_values("album")
+            return self._album_order
+
+        return self._sorted_values("album", positions)
+
+    def ordered_songs(self, order="title", search="", title="", limit=None):
+        return self._ordered(
+            "songs", order, self.match(search=search, title=title), limit
+        )
+
+    def ordered_artists(self, order="name", search="", name="", limit=None):
+        positions = self.match(search=search, albumArtist=name)
+        return self._ordered(
+            "artists", order, self._values("albumArtist", positions), limit
+        )
+
+    def ordered_albums(self, order="name", search="", name="", limit=None):
+        positions = self.match(search=search, album=name)
+        return self._ordered("albums", order, self._values("album", positions), limit)
+
+    def _ordered(self, kind, order, candidates, limit):
+        permutation, rank = self.permutation(kind, order)
+        if candidates is None:
+            return permutation if limit is None else permutation[:limit]
+        if limit is not None and limit * TOP_K_RATIO < len(candidates):
+            return heapq.nsmallest(limit, candidates, key=rank.__getitem__)
+
+        return sorted(candidates, key=rank.__getitem__)
+
+    def permutation(self, kind, order):
+        key = (kind, order)
+        if key not in self._orders:
+            if kind == "songs":
+                permutation = array("i", self._song_permutation(order))
+                rank = array("i", bytes(permutation.itemsize * len(permutation)))
+            else:
+                permutation = (
+                    self._artist_permutation(order)
+                    if kind == "artists"
+                    else self._album_permutation(order)
+                )
+                rank = {}
+            for index, item in enumerate(permutation):
+                rank[item] = index
+            self._orders[key] = (permutation, rank)
+
+        return self._orders[key]
+
+    def _song_permutation(self, order):
+        if order == "title":
+            return (position for _, position in self.song_keys())
+
+        store = self.songs
+        strings = store.strings
+        integers = store.integers
+        if order == "year":
+            years = integers["year"]
+            titles = strings["title"]
+            key = lambda position: (
+                years[position] == MISSING,
+                years[position],
+                titles[position] or "",
+            )
+        elif order == "artist":
+            key = lambda position: (
+                strings["albumArtist"][position] or strings["artist"][position] or "",
+                strings["album"][position] or "",
+                integers["discNumber"][position],
+                integers["trackNumber"][position],
+                strings["title"][position] or "",
+            )
+        elif order == "recently_added":
+            timestamps = integers["creationTimestamp"]
+            key = lambda position: (
+                timestamps[position] == MISSING,
+                -timestamps[position],
+            )
+        else:
+            raise ValueError("Unknown song order {!r}".format(order))
+
+        return sorted(range(len(store)), key=key)
+
+    def _artist_permutation(self, order):
+        if order == "name":
+            return self.artist_names()
+        if order == "recently_added":
+            return latest_first(
+                self.artist_names(),
+                self._latest_additions(self.songs.strings["albumArtist"]),
+            )
+
+        raise ValueError("Unknown artist order {!r}".format(order))
+
+    def _album_permutation(self, order):
+        albums = self.album_names()
+        if order == "name":
+            return albums
+        if order == "year":
+            years = {}
+            for position, album in enumerate(self.songs.strings["album"]):
+                year = self.songs.integers["year"][position]
+                if album is not None and year != MISSING:
+                    years.setdefault(album, Counter())[year] += 1
+            years = most_common(years)
+            return sorted(
+                albums, key=lambda album: (album not in years, years.get(album, 0))
+            )
+        if order == "artist":
+            return sorted(albums, key=lambda album: self.album_artist.get(album) or "")
+        if order == "recently_added":
+            return latest_first(
+                albums, self._latest_additions(self.songs.strings["album"])
+            )
+
+        raise ValueError("Unknown album order {!r}".format(order))
+
+    def _latest_additions(self, column):
+        latest = {}
+        timestamps = self.songs.integers["creationTimestamp"]
+        for position, value in enumerate(column):
+            timestamp = timestamps[position]
+            if value is not None and timestamp > latest.get(value, MISSING):
+                latest[value] = timestamp
+
+        return latest
+
+    def _values(self, field, positions):
+        if positions is None:
+            return None
+
+        column = self.songs.strings[field]
+        return {
+            column[position]
+            for position in positions
+            if column[position] is not None and column[position] != ""
+        }
+
+    def _sorted_values(self, field, positions=None):
+        column = self.songs.strings[field]
+        values = (
+            column
+            if positions is None
+            else (column[position] for position in positions)
+        )
+        return sorted({value for value in values if value is not None and value != ""})
+
+    def search_index(self, field):
+        if field not in self._search_indexes:
+            self._search_indexes[field] = SearchIndex(self.songs.strings[field])
+
+        return self._search_indexes[field]
+
+
+class SearchIndex:
+    size = 3
+
+    def __init__(self, values):
+        self.positions = {}
+        for position, value in enumerate(values):
+            if value is not None:
+                self.positions.setdefault(value.lower(), []).append(position)
+
+        self.grams = {}
+        for value in self.positions:
+            for gram in ngrams(value, self.size):
+                self.grams.setdefault(gram, set()).add(value)
+
+    def find(self, query):
+        query = query.lower()
+        if len(query) < self.size:
+            candidates = self.positions
+        else:
+            postings = sorted(
+                (self.grams.get(gram, set()) for gram in ngrams(query, self.size)),
+                key=len,
+            )
+            candidates = set.intersection(*postings)
+
+        return {
+            position
+            for value in candidates
+            if query in value
+            for position in self.positions[value]
+        }
+
+
+def ngrams(value, size):
+    return {value[i : i + size] for i in range(len(value) - size + 1)}
+
+
+def intersect(positions, matches):
+    if positions is None:
+        return matches
+    return positions & matches
+
+
+def latest_first(names, latest):
+    return sorted(names, key=lambda name: -latest.get(name, MISSING))
+
+
+def most_common(counters):
+    return {key: counter.most_common(1)[0][0] for key, counter in counters.items()}
@@ -0,0 +1,61 @@
+from promise import Promise
+from promise.dataloader import DataLoader
+
+
+class LibraryLoader(DataLoader):
+    def __init__(self, get_library, lookup):
+        super().__init__()
+        self.get_library = get_library
+        self.lookup = lookup
+
+    def batch_load_fn(self, keys):
+        library = self.get_library()
+        return Promise.resolve([self.lookup(library, key) for key in keys])
+
+
+class Loaders:
+    def __init__(self, get_library):
+        self._get_library = get_library
+        self._library = None
+
+        self.album_artist = LibraryLoader(self.get_library, album_artist)
+        self.album_tracks = LibraryLoader(self.get_library, album_tracks)
+        self.album_track_count = LibraryLoader(self.get_library, album_track_count)
+        self.album_disc_count = LibraryLoader(self.get_library, album_disc_count)
+        self.album_art_url = LibraryLoader(self.get_library, album_art_url)
+        self.artist_albums = LibraryLoader(self.get_library, artist_albums)
+
+    def get_library(self, ready=None):
+        if self._library is None:
+            library = self._get_library(ready)
+            if not library.complete:
+                return library
+            self._library = library
+
+        return self._library
+
+
+def album_artist(library, album):
+    artist = library.album_artist.get(album)
+    if artist is not None:
+        return {"name": artist}
+
+
+def album_tracks(library, album):
+    return library.tracks(album)
+
+
+def album_track_count(library, album):
+    return library.album_track_count.get(album, 1)
+
+
+def album_disc_count(library, album):
+    return library.album_disc_count.get(album, 0)
+
+
+def album_art_url(library, album):
+    return library.album_art_url.get(album)
+
+
+def artist_albums(library, artist):
+    return [{"name": album} for album in library.albums(artist)]
@@ -0,0 +1,195 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from threading import Lock
+
+from graphene.types.resolver import get_default_resolver
+from graphql.execution.middleware import MiddlewareManager
+from promise import Promise, is_thenable
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Metrics:
+    def __init__(self):
+        self.histograms = {}
+        self._lock = Lock()
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(name, documentation, buckets)
+            return self.histograms[name]
+
+    def render(self):
+        with self._lock:
+            histograms = list(self.histograms.values())
+
+        return "".join(histogram.render() for histogram in histograms)
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+
+        self._series = {}
+        self._lock = Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [
+            "# HELP {} {}".format(self.name, self.documentation),
+            "# TYPE {} histogram".format(self.name),
+        ]
+        with self._lock:
+            series = sorted(
+                (key, (list(counts), count, total))
+                for key, (counts, count, total) in self._series.items()
+            )
+
+        for key, (counts, count, total) in series:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(
+                    "{}_bucket{} {}".format(
+                        self.name, labels(key + (("le", repr(bound)),)), cumulative
+                    )
+                )
+            lines.append(
+                "{}_bucket{} {}".format(
+                    self.name, labels(key + (("le", "+Inf"),)), count
+                )
+            )
+            lines.append("{}_count{} {}".format(self.name, labels(key), count))
+            lines.append("{}_sum{} {!r}".format(self.name, labels(key), total))
+
+        return "\n".join(lines) + "\n"
+
+
+class ResolverTimer:
+    def __init__(self, histogram=None, trace=None):
+        self.histogram = histogram
+        self.trace = trace
+
+    def resolve(self, next, root, info, **args):
+        if self.trace is None and getattr(next, "func", None) is get_default_resolver():
+            return next(root, info, **args)
+
+        start = time.perf_counter()
+        result = next(root, info, **args)
+        if is_thenable(result):
+            return Promise.resolve(result).then(
+                lambda value: self.record(info, start, value)
+            )
+
+        return self.record(info, start, result)
+
+    def record(self, info, start, value):
+        end = time.perf_counter()
+        if self.histogram is not None:
+            self.histogram.observe(
+                end - start,
+                field="{}.{}".format(info.parent_type.name, info.field_name),
+            )
+        if self.trace is not None:
+            self.trace.add(info, start, end)
+
+        return value
+
+    def middleware(self):
+        return MiddlewareManager(self, wrap_in_promise=False)
+
+
+class Trace:
+    def __init__(self):
+        self.start_time = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.resolvers = []
+        self.operations = []
+
+    def add(self, info, start, end):
+        self.operations.append(info.operation)
+        self.resolvers.append(
+            {
+                "path": list(info.path),
+                "parentType": info.parent_type.name,
+                "fieldName": info.field_name,
+                "returnType": str(info.return_type),
+                "startOffset": nanoseconds(start - self.start),
+                "duration": nanoseconds(end - start),
+            }
+        )
+
+    def to_dict(self, operation=None):
+        resolvers = [
+            resolver
+            for resolver_operation, resolver in zip(self.operations, self.resolvers)
+            if operation is None or resolver_operation is operation
+        ]
+        duration = time.perf_counter() - self.start
+        return {
+            "version": 1,
+            "startTime": self.start_time.isoformat(),
+            "endTime": datetime.now(timezone.utc).isoformat(),
+            "duration": nanoseconds(duration),
+            "execution": {"resolvers": resolvers},
+        }
+
+
+def labels(key):
+    if not key:
+        return ""
+
+    return "{{{}}}".format(
+        ",".join(
+            '{}="{}"'.format(
+                name,
+                str(value)
+                .replace("\\", "\\\\")
+                .replace("\n", "\\n")
+                .replace('"', '\\"'),
+            )
+            for name, value in key
+        )
+    )
+
+
+def nanoseconds(seconds):
+    return int(seconds * 1e9)
@@ -0,0 +1,31 @@
+import base64
+import json
+from bisect import bisect_right
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        raise ValueError("Invalid cursor {!r}".format(cursor))
+
+    if isinstance(key, list):
+        return tuple(key)
+    return key
+
+
+def page(keys, first=None, after=None):
+    if first is not None and first < 0:
+        raise ValueError("Argument 'first' must be a non-negative integer")
+
+    try:
+        start = 0 if after is None else bisect_right(keys, decode_cursor(after))
+    except TypeError:
+        raise ValueError("Invalid cursor {!r}".format(after))
+    end = len(keys) if first is None else min(start + first, len(keys))
+
+    return keys[start:end], start > 0, end < len(keys)
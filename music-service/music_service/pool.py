@@ -0,0 +1,78 @@
+import time
+from collections import defaultdict
+from threading import Lock
+
+
+class SessionPool:
+    def __init__(self, idle_timeout=600, max_per_account=2, clock=time.monotonic):
+        self.idle_timeout = idle_timeout
+        self.max_per_account = max_per_account
+        self.clock = clock
+
+        self._idle = defaultdict(list)
+        self._lock = Lock()
+
+    def acquire(self, key):
+        with self._lock:
+            expired = self._prune()
+            candidates = self._idle.pop(key, [])
+
+        for session in expired:
+            session.close()
+
+        while candidates:
+            session, _ = candidates.pop()
+            if session.is_ready():
+                with self._lock:
+                    self._idle[key].extend(candidates)
+                return session
+            session.close()
+
+        return None
+
+    def release(self, session):
+        key = session.session_key
+        if key is None or not session.is_ready():
+            session.close()
+            return
+
+        session.reset()
+        with self._lock:
+            expired = self._prune()
+            if len(self._idle[key]) < self.max_per_account:
+                self._idle[key].append((session, self.clock()))
+            else:
+                expired.append(session)
+
+        for session in expired:
+            session.close()
+
+    def clear(self):
+        with self._lock:
+            sessions = [session for idle in self._idle.values() for session, _ in idle]
+            self._idle.clear()
+
+        for session in sessions:
+            session.close()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(idle) for idle in self._idle.values())
+
+    def _prune(self):
+        now = self.clock()
+        expired = []
+        for key in list(self._idle):
+            idle = []
+            for session, released_at in self._idle[key]:
+                if now - released_at >= self.idle_timeout:
+                    expired.append(session)
+                else:
+                    idle.append((session, released_at))
+
+            if idle:
+                self._idle[key] = idle
+            else:
+                del self._idle[key]
+
+        return expired
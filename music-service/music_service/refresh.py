@@ -0,0 +1,67 @@
+import heapq
+import itertools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+
+class LibraryRefresher:
+    def __init__(self, soft_ttl=60, workers=2, clock=time.monotonic):
+        self.soft_ttl = soft_ttl
+        self.clock = clock
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+        self._queue = []
+        self._pending = {}
+        self._running = set()
+        self._counter = itertools.count()
+        self._lock = Lock()
+
+    def is_stale(self, age):
+        return self.soft_ttl is not None and age is not None and age >= self.soft_ttl
+
+    def schedule(self, key, refresh):
+        active_at = self.clock()
+        with self._lock:
+            if key in self._running:
+                return False
+
+            submit = key not in self._pending
+            self._pending[key] = (active_at, refresh)
+            heapq.heappush(self._queue, (-active_at, next(self._counter), key))
+
+        if submit:
+            self.executor.submit(self._run_next)
+        return True
+
+    def _run_next(self):
+        with self._lock:
+            while self._queue:
+                negative_active_at, _, key = heapq.heappop(self._queue)
+                if (
+                    key in self._pending
+                    and self._pending[key][0] == -negative_active_at
+                ):
+                    _, refresh = self._pending.pop(key)
+                    self._running.add(key)
+                    break
+            else:
+                return
+
+        try:
+            refresh()
+        except Exception:
+            logger.exception("Background library refresh failed")
+        finally:
+            with self._lock:
+                self._running.discard(key)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending) + len(self._running)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
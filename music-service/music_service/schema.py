@@ -1,9 +1,9 @@
-import json
-from collections import Counter
+from threading import Lock
 
 import graphene
 
-from . import db
+from .pagination import encode_cursor, page
+from .upload import UploadError
 
 
 class Song(graphene.ObjectType):
@@ -37,81 +37,39 @@ class Album(graphene.ObjectType):
     total_track_count = graphene.NonNull(graphene.Int)
     total_disc_count = graphene.NonNull(graphene.Int)
     album_art_url = graphene.String()
+    album_art = graphene.String(size=graphene.Int())
 
     @staticmethod
     def resolve_artist(parent, info):
-        artists = Counter(
-            [
-                song["albumArtist"]
-                for song in db.get_db().get_songs()
-                if "albumArtist" in song
-                and song["albumArtist"] != ""
-                and "album" in song
-                and parent["name"] == song["album"]
-            ]
-        )
-        if len(artists) > 0:
-            (artist, _), *_ = artists.most_common(1)
-            return {"name": artist}
+        return info.context["loaders"].album_artist.load(parent["name"])
 
     @staticmethod
     def resolve_tracks(parent, info):
-        return [
-            song
-            for song in db.get_db().get_songs()
-            if "album" in song and parent["name"] == song["album"]
-        ]
+        return info.context["loaders"].album_tracks.load(parent["name"])
 
     @staticmethod
     def resolve_total_track_count(parent, info):
-        counts = Counter(
-            [
-                song["totalTrackCount"]
-                for song in db.get_db().get_songs()
-                if "totalTrackCount" in song
-                and "album" in song
-                and parent["name"] == song["album"]
-            ]
-        )
-        if len(counts) > 0:
-            (count, _), *_ = counts.most_common(1)
-            return count
-        else:
-            return 1
+        return info.context["loaders"].album_track_count.load(parent["name"])
 
     @staticmethod
     def resolve_total_disc_count(parent, info):
-        counts = Counter(
-            [
-                song["totalDiscCount"]
-                for song in db.get_db().get_songs()
-                if "totalDiscCount" in song
-                and "album" in song
-                and parent["name"] == song["album"]
-            ]
-        )
-        if len(counts) > 0:
-            (count, _), *_ = counts.most_common(1)
-            return count
-        else:
-            return 0
+        return info.context["loaders"].album_disc_count.load(parent["name"])
 
     @staticmethod
     def resolve_album_art_url(parent, info):
-        urls = Counter(
-            [
-                ref["url"]
-                for song in db.get_db().get_songs()
-                if "albumArtRef" in song
-                and "album" in song
-                and parent["name"] == song["album"]
-                for ref in song["albumArtRef"]
-                if "url" in ref and ref["url"] != ""
-            ]
+        return info.context["loaders"].album_art_url.load(parent["name"])
+
+    @staticmethod
+    def resolve_album_art(parent, info, size=None):
+        art = info.context["album_art"]
+        if art is None:
+            return None
+
+        return (
+            info.context["loaders"]
+            .album_art_url.load(parent["name"])
+            .then(lambda url: art.url(url, size) if url is not None else None)
         )
-        if len(urls) > 0:
-            (url, _), *_ = urls.most_common(1)
-            return url
 
 
 class Artist(graphene.ObjectType):
@@ -120,15 +78,83 @@ class Artist(graphene.ObjectType):
 
     @staticmethod
     def resolve_albums(parent, info):
-        albums = {
-            song["album"]
-            for song in db.get_db().get_songs()
-            if "album" in song
-            and song["album"] != ""
-            and "artist" in song
-            and parent["name"] == song["albumArtist"]
-        }
-        return [{"name": album} for album in albums]
+        return info.context["loaders"].artist_albums.load(parent["name"])
+
+
+class SongOrder(graphene.Enum):
+    TITLE = "title"
+    YEAR = "year"
+    ARTIST = "artist"
+    RECENTLY_ADDED = "recently_added"
+
+
+class ArtistOrder(graphene.Enum):
+    NAME = "name"
+    RECENTLY_ADDED = "recently_added"
+
+
+class AlbumOrder(graphene.Enum):
+    NAME = "name"
+    YEAR = "year"
+    ARTIST = "artist"
+    RECENTLY_ADDED = "recently_added"
+
+
+class SongConnection(graphene.relay.Connection):
+    class Meta:
+        node = Song
+
+
+class ArtistConnection(graphene.relay.Connection):
+    class Meta:
+        node = Artist
+
+
+class AlbumConnection(graphene.relay.Connection):
+    class Meta:
+        node = Album
+
+
+class LibraryStatus(graphene.ObjectType):
+    loaded_songs = graphene.NonNull(graphene.Int)
+    complete = graphene.NonNull(graphene.Boolean)
+
+    @staticmethod
+    def resolve_loaded_songs(parent, info):
+        return len(parent.songs)
+
+
+class FileUpload(graphene.ObjectType):
+    path = graphene.NonNull(graphene.String)
+    status = graphene.NonNull(graphene.String)
+    reason = graphene.String()
+    song_id = graphene.ID()
+
+
+class UploadJob(graphene.ObjectType):
+    id = graphene.NonNull(graphene.ID)
+    done = graphene.NonNull(graphene.Boolean)
+    files = graphene.NonNull(graphene.List(graphene.NonNull(FileUpload)))
+    uploaded = graphene.NonNull(graphene.Int)
+    matched = graphene.NonNull(graphene.Int)
+    skipped = graphene.NonNull(graphene.Int)
+    failed = graphene.NonNull(graphene.Int)
+
+    @staticmethod
+    def resolve_uploaded(parent, info):
+        return parent.count("uploaded")
+
+    @staticmethod
+    def resolve_matched(parent, info):
+        return parent.count("matched")
+
+    @staticmethod
+    def resolve_skipped(parent, info):
+        return parent.count("skipped")
+
+    @staticmethod
+    def resolve_failed(parent, info):
+        return parent.count("failed")
 
 
 class RootQuery(graphene.ObjectType):
@@ -138,6 +164,8 @@ class RootQuery(graphene.ObjectType):
         search=graphene.String(),
         first=graphene.Int(),
         skip=graphene.Int(),
+        ordered=graphene.Boolean(name="sorted", default_value=True),
+        order_by=SongOrder(default_value=SongOrder.TITLE.value),
     )
     artists = graphene.NonNull(
         graphene.List(lambda: graphene.NonNull(Artist)),
@@ -145,6 +173,7 @@ class RootQuery(graphene.ObjectType):
         search=graphene.String(),
         first=graphene.Int(),
         skip=graphene.Int(),
+        order_by=ArtistOrder(default_value=ArtistOrder.NAME.value),
     )
     albums = graphene.NonNull(
         graphene.List(lambda: graphene.NonNull(Album)),
@@ -152,98 +181,216 @@ class RootQuery(graphene.ObjectType):
         search=graphene.String(),
         first=graphene.Int(),
         skip=graphene.Int(),
+        order_by=AlbumOrder(default_value=AlbumOrder.NAME.value),
+    )
+    library_status = graphene.NonNull(LibraryStatus)
+    upload_job = graphene.Field(UploadJob, id=graphene.NonNull(graphene.ID))
+    songs_connection = graphene.NonNull(
+        SongConnection,
+        title=graphene.String(),
+        search=graphene.String(),
+        first=graphene.Int(),
+        after=graphene.String(),
+    )
+    artists_connection = graphene.NonNull(
+        ArtistConnection,
+        name=graphene.String(),
+        search=graphene.String(),
+        first=graphene.Int(),
+        after=graphene.String(),
+    )
+    albums_connection = graphene.NonNull(
+        AlbumConnection,
+        name=graphene.String(),
+        search=graphene.String(),
+        first=graphene.Int(),
+        after=graphene.String(),
     )
 
     @staticmethod
-    def resolve_songs(parent, info, title="", search="", first=None, skip=None):
-        songs = sorted(
-            [
-                song
-                for song in db.get_db().get_songs()
-                if title.lower() in song["title"].lower()
-                and (
-                    search.lower() in song["title"].lower()
-                    or ("artist" in song and search.lower() in song["artist"].lower())
-                    or (
-                        "albumArtist" in song
-                        and search.lower() in song["albumArtist"].lower()
-                    )
-                    or ("album" in song and search.lower() in song["album"].lower())
-                )
-            ],
-            key=lambda song: song["title"],
+    def resolve_songs(
+        parent,
+        info,
+        title="",
+        search="",
+        first=None,
+        skip=None,
+        ordered=True,
+        order_by="title",
+    ):
+        if not ordered:
+            return unsorted_songs(info, title, search, first, skip or 0)
+
+        library = info.context["loaders"].get_library()
+        positions = window(
+            library.ordered_songs(
+                order_by, search=search, title=title, limit=limit(first, skip)
+            ),
+            first,
+            skip,
         )
-        if skip != None:
-            songs = songs[skip:]
-        if first != None:
-            songs = songs[:first]
-
-        return songs
-
-    @staticmethod
-    def resolve_artists(parent, info, name="", search="", first=None, skip=None):
-        artists = sorted(
-            [
-                {"name": artist}
-                for artist in {
-                    song["albumArtist"]
-                    for song in db.get_db().get_songs()
-                    if "albumArtist" in song
-                    and song["albumArtist"] != ""
-                    and name.lower() in song["albumArtist"].lower()
-                    and (
-                        search.lower() in song["title"].lower()
-                        or (
-                            "artist" in song
-                            and search.lower() in song["artist"].lower()
-                        )
-                        or search.lower() in song["albumArtist"].lower()
-                        or ("album" in song and search.lower() in song["album"].lower())
-                    )
-                }
-            ],
-            key=lambda artist: artist["name"],
+
+        return [library.songs[position] for position in positions]
+
+    @staticmethod
+    def resolve_artists(
+        parent, info, name="", search="", first=None, skip=None, order_by="name"
+    ):
+        artists = (
+            info.context["loaders"]
+            .get_library()
+            .ordered_artists(
+                order_by, search=search, name=name, limit=limit(first, skip)
+            )
         )
-        if skip != None:
-            artists = artists[skip:]
-        if first != None:
-            artists = artists[:first]
-
-        return artists
-
-    @staticmethod
-    def resolve_albums(parent, info, name="", search="", first=None, skip=None):
-        albums = sorted(
-            [
-                {"name": album}
-                for album in {
-                    song["album"]
-                    for song in db.get_db().get_songs()
-                    if "album" in song
-                    and song["album"] != ""
-                    and name.lower() in song["album"].lower()
-                    and (
-                        search.lower() in song["title"].lower()
-                        or (
-                            "artist" in song
-                            and search.lower() in song["artist"].lower()
-                        )
-                        or (
-                            "albumArtist" in song
-                            and search.lower() in song["albumArtist"].lower()
-                        )
-                        or search.lower() in song["album"].lower()
-                    )
-                }
-            ],
-            key=lambda album: album["name"],
+
+        return [{"name": artist} for artist in window(artists, first, skip)]
+
+    @staticmethod
+    def resolve_albums(
+        parent, info, name="", search="", first=None, skip=None, order_by="name"
+    ):
+        albums = (
+            info.context["loaders"]
+            .get_library()
+            .ordered_albums(
+                order_by, search=search, name=name, limit=limit(first, skip)
+            )
         )
-        if skip != None:
-            albums = albums[skip:]
-        if first != None:
-            albums = albums[:first]
 
-        return albums
+        return [{"name": album} for album in window(albums, first, skip)]
+
+    @staticmethod
+    def resolve_library_status(parent, info):
+        return info.context["loaders"].get_library(lambda library: True)
+
+    @staticmethod
+    def resolve_upload_job(parent, info, id):
+        return uploads(info).get(id)
+
+    @staticmethod
+    def resolve_songs_connection(
+        parent, info, title="", search="", first=None, after=None
+    ):
+        library = info.context["loaders"].get_library()
+        return connection(
+            SongConnection,
+            library.song_keys(search=search, title=title),
+            lambda key: library.songs[key[1]],
+            first,
+            after,
+        )
+
+    @staticmethod
+    def resolve_artists_connection(
+        parent, info, name="", search="", first=None, after=None
+    ):
+        return connection(
+            ArtistConnection,
+            info.context["loaders"]
+            .get_library()
+            .artist_names(search=search, name=name),
+            lambda name: {"name": name},
+            first,
+            after,
+        )
+
+    @staticmethod
+    def resolve_albums_connection(
+        parent, info, name="", search="", first=None, after=None
+    ):
+        return connection(
+            AlbumConnection,
+            info.context["loaders"].get_library().album_names(search=search, name=name),
+            lambda name: {"name": name},
+            first,
+            after,
+        )
+
+
+class UploadSongs(graphene.Mutation):
+    class Arguments:
+        paths = graphene.NonNull(graphene.List(graphene.NonNull(graphene.String)))
+
+    Output = UploadJob
+
+    @staticmethod
+    def mutate(parent, info, paths):
+        return uploads(info).start(paths)
+
+
+class RootMutation(graphene.ObjectType):
+    upload_songs = UploadSongs.Field()
+
+
+def uploads(info):
+    if "uploads" not in info.context:
+        raise UploadError("Uploads are not available on this endpoint.")
+
+    return info.context["uploads"]
+
+
+def limit(first, skip):
+    if first is None or first < 0 or (skip or 0) < 0:
+        return None
+
+    return first + (skip or 0)
+
+
+def window(items, first, skip):
+    if skip != None:
+        items = items[skip:]
+    if first != None:
+        items = items[:first]
+
+    return items
+
+
+def unsorted_songs(info, title, search, first, skip):
+    def ready(library):
+        return len(library.find(search=search, title=title)) >= skip + first
+
+    library = info.context["loaders"].get_library(ready if first != None else None)
+    songs = library.find(search=search, title=title)[skip:]
+    if first != None:
+        songs = songs[:first]
+
+    return songs
+
+
+def connection(connection_type, keys, node, first, after):
+    keys, has_previous_page, has_next_page = page(keys, first, after)
+    edges = [
+        connection_type.Edge(node=node(key), cursor=encode_cursor(key)) for key in keys
+    ]
+
+    return connection_type(
+        edges=edges,
+        page_info=graphene.relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=has_previous_page,
+            has_next_page=has_next_page,
+        ),
+    )
+
+
+_schema = None
+_schema_lock = Lock()
+
+
+def get_schema():
+    global _schema
+    if _schema is None:
+        with _schema_lock:
+            if _schema is None:
+                _schema = graphene.Schema(query=RootQuery, mutation=RootMutation)
+
+    return _schema
+
 
+def __getattr__(name):
+    if name == "schema":
+        return get_schema()
 
-schema = graphene.Schema(query=RootQuery)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
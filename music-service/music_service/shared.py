@@ -0,0 +1,306 @@
+import fcntl
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from array import array
+from collections.abc import Sequence
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+
+from .library import Library
+from .store import INTEGER_FIELDS, STRING_FIELDS, TIMESTAMP_FIELDS, SongStore
+
+MAGIC = b"MTLM"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQQqI64s")
+SECTION = struct.Struct("<QQ")
+ALIGNMENT = 8
+
+INTEGER_IDS = 1
+SYNCED = 2
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class SharedLibraryStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self._mapped = {}
+        self._lock = Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, "{}.library".format(key))
+
+    def save(self, key, library, current=None):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f, self._exclusive(key):
+                f.write(encode(library, self.generation(key) + 1))
+                f.flush()
+                os.fsync(f.fileno())
+                with self._lock:
+                    if current is not None and not current():
+                        os.unlink(temp_path)
+                        return False
+                    os.replace(temp_path, self.path(key))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        self.load(key)
+        return True
+
+    def load(self, key):
+        try:
+            f = open(self.path(key), "rb")
+        except OSError:
+            with self._lock:
+                self._mapped.pop(key, None)
+            return None
+
+        with f:
+            stat = os.fstat(f.fileno())
+            identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            with self._lock:
+                mapped = self._mapped.get(key)
+            if mapped is not None and mapped[0] == identity:
+                return mapped[1]
+            if stat.st_size < HEADER.size:
+                return None
+
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        library = decode(buffer)
+        if library is None:
+            return None
+
+        with self._lock:
+            self._mapped[key] = (identity, library)
+        return library
+
+    def latest(self, key, library):
+        try:
+            stat = os.stat(self.path(key))
+        except OSError:
+            return None
+
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            mapped = self._mapped.get(key)
+        if mapped is not None and mapped[0] == identity:
+            return mapped[1] if mapped[1] is not library else None
+
+        latest = self.load(key)
+        return latest if latest is not library else None
+
+    def generation(self, key):
+        try:
+            with open(self.path(key), "rb") as f:
+                data = f.read(HEADER.size)
+        except OSError:
+            return 0
+
+        if len(data) < HEADER.size:
+            return 0
+        magic, version, _, generation, _, _, _, _ = HEADER.unpack(data)
+        if magic != MAGIC or version != VERSION:
+            return 0
+
+        return generation
+
+    def delete(self, key):
+        with self._exclusive(key), self._lock:
+            self._mapped.pop(key, None)
+            try:
+                os.unlink(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    @contextmanager
+    def _exclusive(self, key):
+        with open(self.path(key) + ".lock", "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class MappedSongStore(SongStore):
+    def __init__(self, ids, strings, integers, art_urls, digest):
+        self.ids = ids
+        self.strings = strings
+        self.integers = integers
+        self.art_urls = art_urls
+        self._digest = digest
+
+    def extend(self, songs, interned=None):
+        raise TypeError("Mapped libraries are read-only.")
+
+    def digest(self):
+        return self._digest
+
+
+class StringColumn(Sequence):
+    def __init__(self, data, offsets, nulls):
+        self.data = data
+        self.offsets = offsets
+        self.nulls = nulls
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(len(self))[position]]
+        if position < 0:
+            position += len(self.nulls)
+        if not 0 <= position < len(self.nulls):
+            raise IndexError(position)
+        if self.nulls[position]:
+            return None
+
+        return str(
+            self.data[self.offsets[position] : self.offsets[position + 1]], "utf-8"
+        )
+
+    def __iter__(self):
+        data = self.data
+        offsets = self.offsets
+        for position, null in enumerate(self.nulls):
+            if null:
+                yield None
+            else:
+                yield str(data[offsets[position] : offsets[position + 1]], "utf-8")
+
+    def __len__(self):
+        return len(self.nulls)
+
+
+class ArtColumn(Sequence):
+    def __init__(self, urls):
+        self.urls = urls
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(len(self))[position]]
+
+        urls = self.urls[position]
+        return tuple(urls.split("\n")) if urls is not None else None
+
+    def __len__(self):
+        return len(self.urls)
+
+
+def encode(library, generation):
+    store = library.songs
+    flags = 0
+    sections = []
+    if all(type(song_id) is int for song_id in store.ids):
+        flags |= INTEGER_IDS
+        sections.append(array("q", store.ids).tobytes())
+    else:
+        sections.extend(encode_strings(str(song_id) for song_id in store.ids))
+    for field in STRING_FIELDS:
+        sections.extend(encode_strings(store.strings[field]))
+    for field in INTEGER_FIELDS:
+        sections.append(array("i", store.integers[field]).tobytes())
+    for field in TIMESTAMP_FIELDS:
+        sections.append(array("q", store.integers[field]).tobytes())
+    sections.extend(
+        encode_strings(
+            "\n".join(urls) if urls is not None else None for urls in store.art_urls
+        )
+    )
+
+    body = bytearray()
+    table = []
+    start = HEADER.size + SECTION.size * len(sections)
+    for section in sections:
+        body.extend(bytes(-(start + len(body)) % ALIGNMENT))
+        table.append(SECTION.pack(start + len(body), len(section)))
+        body.extend(section)
+    body = b"".join(table) + body
+
+    synced_at = 0
+    if library.synced_at is not None:
+        flags |= SYNCED
+        synced_at = (library.synced_at - EPOCH) // timedelta(microseconds=1)
+
+    return (
+        HEADER.pack(
+            MAGIC,
+            VERSION,
+            flags,
+            generation,
+            len(store),
+            synced_at,
+            zlib.crc32(body),
+            library.version.encode("ascii"),
+        )
+        + body
+    )
+
+
+def encode_strings(values):
+    offsets = array("q", [0])
+    nulls = bytearray()
+    data = bytearray()
+    for value in values:
+        if value is None:
+            nulls.append(1)
+        else:
+            nulls.append(0)
+            data.extend(value.encode("utf-8"))
+        offsets.append(len(data))
+
+    return [offsets.tobytes(), bytes(nulls), bytes(data)]
+
+
+def decode(buffer):
+    view = memoryview(buffer)
+    magic, version, flags, _, _, synced_at, checksum, digest = HEADER.unpack_from(view)
+    if magic != MAGIC or version != VERSION:
+        return None
+    if zlib.crc32(view[HEADER.size :]) != checksum:
+        return None
+
+    sections = iter(section_views(view, flags))
+    try:
+        if flags & INTEGER_IDS:
+            ids = next(sections).cast("q")
+        else:
+            ids = decode_strings(sections)
+        strings = {field: decode_strings(sections) for field in STRING_FIELDS}
+        integers = {field: next(sections).cast("i") for field in INTEGER_FIELDS}
+        integers.update((field, next(sections).cast("q")) for field in TIMESTAMP_FIELDS)
+        art_urls = ArtColumn(decode_strings(sections))
+    except (StopIteration, TypeError, ValueError):
+        return None
+
+    return Library(
+        MappedSongStore(ids, strings, integers, art_urls, digest.decode("ascii")),
+        synced_at=EPOCH + timedelta(microseconds=synced_at) if flags & SYNCED else None,
+    )
+
+
+def section_views(view, flags):
+    sections = (
+        (1 if flags & INTEGER_IDS else 3)
+        + 3 * len(STRING_FIELDS)
+        + len(INTEGER_FIELDS)
+        + len(TIMESTAMP_FIELDS)
+        + 3
+    )
+    for index in range(sections):
+        offset, length = SECTION.unpack_from(view, HEADER.size + index * SECTION.size)
+        if offset + length > len(view):
+            raise ValueError("Section {} is out of bounds".format(index))
+        yield view[offset : offset + length]
+
+
+def decode_strings(sections):
+    offsets = next(sections).cast("q")
+    nulls = next(sections)
+    data = next(sections)
+
+    return StringColumn(data, offsets, nulls)
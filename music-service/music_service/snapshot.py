@@ -0,0 +1,88 @@
+import json
+import os
+import struct
+import tempfile
+import zlib
+from datetime import datetime
+from threading import Lock
+
+from .library import Library
+
+MAGIC = b"MTLS"
+VERSION = 1
+HEADER = struct.Struct(">4sHI")
+
+
+class SnapshotStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, "{}.snapshot".format(key))
+
+    def save(self, key, library, current=None):
+        payload = zlib.compress(
+            json.dumps(
+                {
+                    "syncedAt": library.synced_at.isoformat()
+                    if library.synced_at is not None
+                    else None,
+                    "songs": [dict(song) for song in library.songs],
+                },
+                separators=(",", ":"),
+            ).encode("utf-8")
+        )
+
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, zlib.crc32(payload)))
+                f.write(payload)
+            with self._lock:
+                if current is not None and not current():
+                    os.unlink(temp_path)
+                    return False
+                os.replace(temp_path, self.path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        return True
+
+    def load(self, key):
+        try:
+            with open(self.path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        if len(data) < HEADER.size:
+            return None
+        magic, version, checksum = HEADER.unpack_from(data)
+        payload = data[HEADER.size :]
+        if magic != MAGIC or version != VERSION or zlib.crc32(payload) != checksum:
+            return None
+
+        try:
+            snapshot = json.loads(zlib.decompress(payload))
+        except (ValueError, zlib.error):
+            return None
+
+        synced_at = snapshot["syncedAt"]
+        return Library(
+            snapshot["songs"],
+            synced_at=datetime.fromisoformat(synced_at)
+            if synced_at is not None
+            else None,
+        )
+
+    def latest(self, key, library):
+        return None
+
+    def delete(self, key):
+        with self._lock:
+            try:
+                os.unlink(self.path(key))
+            except FileNotFoundError:
+                pass
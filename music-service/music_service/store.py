@@ -0,0 +1,148 @@
+import hashlib
+from array import array
+from collections.abc import Mapping, Sequence
+
+STRING_FIELDS = ("title", "artist", "albumArtist", "album", "clientId")
+INTEGER_FIELDS = (
+    "year",
+    "trackNumber",
+    "discNumber",
+    "totalTrackCount",
+    "totalDiscCount",
+)
+TIMESTAMP_FIELDS = ("creationTimestamp",)
+FIELDS = ("id",) + STRING_FIELDS + INTEGER_FIELDS + TIMESTAMP_FIELDS + ("albumArtRef",)
+MISSING = -(2 ** 31)
+
+
+class SongStore(Sequence):
+    def __init__(self, songs=()):
+        self.ids = []
+        self.strings = {field: [] for field in STRING_FIELDS}
+        self.integers = {field: array("i") for field in INTEGER_FIELDS}
+        self.integers.update((field, array("q")) for field in TIMESTAMP_FIELDS)
+        self.art_urls = []
+
+        self.extend(songs)
+
+    def extend(self, songs, interned=None):
+        if interned is None:
+            interned = {}
+
+        for song in songs:
+            if song.get("deleted", False):
+                continue
+
+            self.ids.append(song["id"])
+            for field, column in self.strings.items():
+                value = song.get(field)
+                if value is not None:
+                    value = interned.setdefault(value, value)
+                column.append(value)
+            for field, column in self.integers.items():
+                value = song.get(field)
+                column.append(MISSING if value is None else int(value))
+
+            urls = tuple(
+                interned.setdefault(ref["url"], ref["url"])
+                for ref in song.get("albumArtRef", [])
+                if "url" in ref
+            )
+            self.art_urls.append(urls if urls else None)
+
+    def digest(self):
+        digest = hashlib.sha256(repr(self.ids).encode("utf-8"))
+        for field in STRING_FIELDS:
+            digest.update(repr(self.strings[field]).encode("utf-8"))
+        for field in INTEGER_FIELDS + TIMESTAMP_FIELDS:
+            digest.update(self.integers[field].tobytes())
+        digest.update(repr(self.art_urls).encode("utf-8"))
+
+        return digest.hexdigest()
+
+    def column(self, field):
+        if field == "id":
+            return self.ids
+        if field in self.strings:
+            return self.strings[field]
+        if field in self.integers:
+            return [
+                None if value == MISSING else value for value in self.integers[field]
+            ]
+        raise KeyError(field)
+
+    def value(self, position, field):
+        if field == "id":
+            return self.ids[position]
+        if field in self.strings:
+            value = self.strings[field][position]
+            if value is not None:
+                return value
+        elif field in self.integers:
+            value = self.integers[field][position]
+            if value != MISSING:
+                return value
+        elif field == "albumArtRef":
+            urls = self.art_urls[position]
+            if urls is not None:
+                return [{"url": url} for url in urls]
+
+        raise KeyError(field)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [SongRow(self, i) for i in range(len(self.ids))[position]]
+        if position < 0:
+            position += len(self.ids)
+        if not 0 <= position < len(self.ids):
+            raise IndexError(position)
+
+        return SongRow(self, position)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class StorePrefix(Sequence):
+    def __init__(self, store, length):
+        self.store = store
+        self.length = length
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [SongRow(self.store, i) for i in range(self.length)[position]]
+        if position < 0:
+            position += self.length
+        if not 0 <= position < self.length:
+            raise IndexError(position)
+
+        return SongRow(self.store, position)
+
+    def __len__(self):
+        return self.length
+
+
+class SongRow(Mapping):
+    __slots__ = ("store", "position")
+
+    def __init__(self, store, position):
+        self.store = store
+        self.position = position
+
+    def __getitem__(self, field):
+        return self.store.value(self.position, field)
+
+    def __getattr__(self, field):
+        try:
+            return self.store.value(self.position, field)
+        except KeyError:
+            raise AttributeError(field)
+
+    def __iter__(self):
+        return (field for field in FIELDS if field in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return "SongRow({!r})".format(dict(self))
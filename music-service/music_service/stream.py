@@ -0,0 +1,121 @@
+from threading import Condition, Lock
+
+from .library import SEARCH_FIELDS, Library
+from .store import SongStore, StorePrefix
+
+
+class LibraryStream:
+    def __init__(self, synced_at):
+        self.synced_at = synced_at
+        self.library = PartialLibrary(SongStore(), 0, synced_at)
+        self.done = False
+        self.error = None
+
+        self._store = SongStore()
+        self._interned = {}
+        self._condition = Condition()
+
+    def add(self, songs):
+        self._store.extend(songs, self._interned)
+        library = PartialLibrary(self._store, len(self._store), self.synced_at)
+        self._publish(library)
+
+    def finish(self):
+        self._interned = None
+        library = Library(self._store, synced_at=self.synced_at)
+        self._publish(library, done=True)
+        return library
+
+    def fail(self, error):
+        with self._condition:
+            self.error = error
+            self.done = True
+            self._condition.notify_all()
+
+    def wait(self, ready=None):
+        library = None
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self.done or self.library is not library
+                )
+                if self.error is not None:
+                    raise self.error
+                library = self.library
+                if self.done:
+                    return library
+
+            if ready is not None and ready(library):
+                return library
+
+    def _publish(self, library, done=False):
+        with self._condition:
+            self.library = library
+            self.done = done
+            self._condition.notify_all()
+
+
+class PartialLibrary:
+    complete = False
+
+    def __init__(self, store, length, synced_at):
+        self.songs = StorePrefix(store, length)
+        self.synced_at = synced_at
+
+    def find(self, search="", **fields):
+        store = self.songs.store
+        queries = [
+            (store.strings[field], query.lower())
+            for field, query in fields.items()
+            if query != ""
+        ]
+        if search != "":
+            search = search.lower()
+            columns = [store.strings[field] for field in SEARCH_FIELDS]
+        else:
+            columns = []
+
+        return [
+            song
+            for position, song in enumerate(self.songs)
+            if all(contains(column[position], query) for column, query in queries)
+            and (
+                not columns
+                or any(contains(column[position], search) for column in columns)
+            )
+        ]
+
+
+class LibraryStreams:
+    def __init__(self, executor):
+        self.executor = executor
+
+        self._streams = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._streams.get(key)
+
+    def start(self, key, synced_at, produce):
+        with self._lock:
+            if key in self._streams:
+                return self._streams[key]
+
+            stream = self._streams[key] = LibraryStream(synced_at)
+        self.executor.submit(self._run, key, stream, produce)
+        return stream
+
+    def _run(self, key, stream, produce):
+        try:
+            produce(stream)
+        except Exception as e:
+            stream.fail(e)
+        finally:
+            with self._lock:
+                if self._streams.get(key) is stream:
+                    del self._streams[key]
+
+
+def contains(value, query):
+    return value is not None and query in value.lower()
@@ -0,0 +1,195 @@
+import heapq
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from threading import Condition, Lock, Thread
+
+from .db import SingleFlight, account_key
+
+logger = logging.getLogger(__name__)
+
+MINIMUM_LIFETIME = timedelta(seconds=60)
+
+
+class TokenManager:
+    def __init__(
+        self, refresh_ahead=300, idle_timeout=3600, workers=2, clock=datetime.utcnow
+    ):
+        self.refresh_ahead = timedelta(seconds=refresh_ahead)
+        self.idle_timeout = timedelta(seconds=idle_timeout)
+        self.clock = clock
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.flights = SingleFlight()
+
+        self._tokens = {}
+        self._queue = []
+        self._counter = itertools.count()
+        self._scheduler = None
+        self._closed = False
+        self._lock = Lock()
+        self._wakeup = Condition(self._lock)
+
+    def manage(self, credentials):
+        key = account_key(credentials)
+        if key is None:
+            return credentials
+
+        now = self.clock()
+        with self._lock:
+            token = self._tokens.get(key)
+            if (token is None or is_later(credentials.token_expiry, token.expiry)) and (
+                is_fresh(credentials.token_expiry, now)
+            ):
+                token = self._tokens[key] = AccessToken(
+                    credentials.access_token, credentials.token_expiry, credentials
+                )
+            if token is not None:
+                credentials.access_token = token.access_token
+                credentials.token_expiry = token.expiry
+                token.used_at = now
+                arm = not token.scheduled
+            else:
+                arm = False
+
+        credentials.refresh = partial(self.refresh, credentials)
+        if arm:
+            self._arm(key, token)
+        return credentials
+
+    def refresh(self, credentials, http=None):
+        key = account_key(credentials)
+        with self._lock:
+            token = self._tokens.get(key)
+        if token is None or not is_fresh(token.expiry, self.clock()):
+            try:
+                token = self.flights.do(key, lambda: self._fetch(key, credentials))
+            except Exception:
+                credentials.invalid = True
+                raise
+
+        credentials.access_token = token.access_token
+        credentials.token_expiry = token.expiry
+        credentials.invalid = False
+
+    def cached(self, credentials):
+        with self._lock:
+            return self._tokens.get(account_key(credentials))
+
+    def _fetch(self, key, credentials, replacing=None):
+        with self._lock:
+            token = self._tokens.get(key)
+        if (
+            token is not None
+            and token is not replacing
+            and is_fresh(token.expiry, self.clock())
+        ):
+            return token
+
+        import httplib2
+
+        plain = type(credentials)(
+            access_token=None,
+            client_id=credentials.client_id,
+            client_secret=credentials.client_secret,
+            refresh_token=credentials.refresh_token,
+            token_expiry=None,
+            token_uri=credentials.token_uri,
+            user_agent=credentials.user_agent,
+        )
+        plain.refresh(httplib2.Http())
+
+        refreshed = AccessToken(plain.access_token, plain.token_expiry, credentials)
+        refreshed.used_at = replacing.used_at if replacing is not None else self.clock()
+        with self._lock:
+            self._tokens[key] = refreshed
+        self._arm(key, refreshed)
+        return refreshed
+
+    def _arm(self, key, token):
+        if not is_fresh(token.expiry, self.clock()):
+            return
+
+        with self._lock:
+            if self._closed or token.scheduled:
+                return
+            if self._tokens.get(key) is not token:
+                return
+            token.scheduled = True
+            heapq.heappush(
+                self._queue,
+                (token.expiry - self.refresh_ahead, next(self._counter), key, token),
+            )
+            if self._scheduler is None:
+                self._scheduler = Thread(target=self._run_scheduler, daemon=True)
+                self._scheduler.start()
+            self._wakeup.notify()
+
+    def _run_scheduler(self):
+        with self._lock:
+            while not self._closed:
+                if not self._queue:
+                    self._wakeup.wait()
+                    continue
+                due_at, _, key, token = self._queue[0]
+                delay = (due_at - self.clock()).total_seconds()
+                if delay > 0:
+                    self._wakeup.wait(delay)
+                    continue
+
+                heapq.heappop(self._queue)
+                if self._tokens.get(key) is token:
+                    self.executor.submit(self._refresh_ahead, key, token)
+
+    def _refresh_ahead(self, key, token):
+        with self._lock:
+            if self._tokens.get(key) is not token:
+                return
+            if (
+                token.used_at is None
+                or self.clock() - token.used_at > self.idle_timeout
+            ):
+                del self._tokens[key]
+                return
+
+        try:
+            self.flights.do(
+                key, lambda: self._fetch(key, token.credentials, replacing=token)
+            )
+        except Exception:
+            logger.exception("Background token refresh failed")
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tokens)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            self._closed = True
+            self._queue.clear()
+            self._wakeup.notify_all()
+            scheduler = self._scheduler
+        if scheduler is not None and wait:
+            scheduler.join()
+        self.executor.shutdown(wait=wait)
+
+
+class AccessToken:
+    def __init__(self, access_token, expiry, credentials):
+        self.access_token = access_token
+        self.expiry = expiry
+        self.credentials = credentials
+        self.used_at = None
+        self.scheduled = False
+
+
+def is_fresh(expiry, now):
+    return isinstance(expiry, datetime) and expiry - now > MINIMUM_LIFETIME
+
+
+def is_later(expiry, than):
+    if not isinstance(expiry, datetime):
+        return False
+
+    return than is None or expiry > than
@@ -0,0 +1,229 @@
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Queue
+from threading import Lock
+
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = (".mp3", ".flac", ".m4a", ".aac", ".ogg", ".wma", ".wav", ".alac")
+
+
+class UploadError(Exception):
+    pass
+
+
+class Uploader:
+    def __init__(self, directory, workers=4, job_ttl=3600, max_jobs=64):
+        self.directory = directory
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.jobs = LRUCache(ttl=job_ttl, max_entries=max_jobs)
+
+    def start(self, session, paths):
+        if self.directory is None:
+            raise UploadError("Uploads are disabled on this server.")
+        if session.manager_credentials is None:
+            raise UploadError("Uploading requires Music-Manager-Authorization.")
+
+        paths = self.resolve(paths)
+        library = session.get_library() if session.account is not None else None
+        job = UploadJob(paths, known_tracks(library))
+        self.jobs.set(job.id, job)
+        for _ in range(min(self.workers, len(job.files))):
+            self.executor.submit(job.work, session.clone)
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def bind(self, get_session):
+        return Uploads(self, get_session)
+
+    def resolve(self, paths):
+        root = os.path.realpath(self.directory)
+        files = []
+        for path in paths:
+            path = os.path.realpath(os.path.join(root, path))
+            if os.path.commonpath([root, path]) != root:
+                raise UploadError("{} is outside the upload directory.".format(path))
+            if os.path.isdir(path):
+                files.extend(audio_files(path))
+            elif os.path.isfile(path):
+                files.append(path)
+            else:
+                raise UploadError("{} does not exist.".format(path))
+
+        return list(dict.fromkeys(files))
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+class Uploads:
+    def __init__(self, uploader, get_session):
+        self.uploader = uploader
+        self.get_session = get_session
+
+    def start(self, paths):
+        return self.uploader.start(self.get_session(), paths)
+
+    def get(self, job_id):
+        return self.uploader.get(job_id)
+
+
+class UploadJob:
+    def __init__(self, paths, known):
+        self.id = uuid.uuid4().hex
+        self.files = [FileUpload(path) for path in paths]
+        self.client_ids, self.metadata = known
+
+        self._queue = Queue()
+        for upload in self.files:
+            self._queue.put(upload)
+        self._lock = Lock()
+
+    @property
+    def done(self):
+        return all(upload.finished for upload in self.files)
+
+    def count(self, status):
+        return sum(1 for upload in self.files if upload.status == status)
+
+    def work(self, open_session):
+        session = None
+        try:
+            for upload in iter(self.next_upload, None):
+                if self.skip(upload):
+                    continue
+                if session is None:
+                    try:
+                        session = open_session()
+                    except Exception as e:
+                        logger.exception("Opening an upload session failed")
+                        upload.finish("failed", reason=str(e))
+                        self.fail_pending(str(e))
+                        return
+                upload.run(session)
+        finally:
+            if session is not None:
+                session.close()
+
+    def next_upload(self):
+        try:
+            return self._queue.get_nowait()
+        except Empty:
+            return None
+
+    def skip(self, upload):
+        try:
+            client_id = content_hash(upload.path)
+            metadata = read_metadata(upload.path)
+        except Exception as e:
+            upload.finish("failed", reason=str(e))
+            return True
+
+        with self._lock:
+            if client_id is not None and client_id in self.client_ids:
+                upload.finish("skipped", reason="DUPLICATE_CONTENT")
+                return True
+            if metadata is not None and metadata in self.metadata:
+                upload.finish("skipped", reason="DUPLICATE_METADATA")
+                return True
+            if client_id is not None:
+                self.client_ids.add(client_id)
+            if metadata is not None:
+                self.metadata.add(metadata)
+
+        return False
+
+    def fail_pending(self, reason):
+        for upload in iter(self.next_upload, None):
+            upload.finish("failed", reason=reason)
+
+
+class FileUpload:
+    def __init__(self, path):
+        self.path = path
+        self.status = "pending"
+        self.reason = None
+        self.song_id = None
+
+    @property
+    def finished(self):
+        return self.status not in ("pending", "uploading")
+
+    def run(self, session):
+        self.status = "uploading"
+        try:
+            uploaded, matched, not_uploaded = session.upload(self.path)
+        except Exception as e:
+            logger.exception("Uploading %s failed", self.path)
+            self.finish("failed", reason=str(e))
+            return
+
+        if self.path in uploaded:
+            self.finish("uploaded", song_id=uploaded[self.path])
+        elif self.path in matched:
+            self.finish("matched", song_id=matched[self.path])
+        else:
+            self.finish("failed", reason=not_uploaded.get(self.path))
+
+    def finish(self, status, reason=None, song_id=None):
+        self.reason = reason
+        self.song_id = song_id
+        self.status = status
+        logger.info("Upload of %s %s", self.path, status)
+
+
+def known_tracks(library):
+    if library is None:
+        return set(), set()
+
+    store = library.songs
+    client_ids = {
+        client_id for client_id in store.strings["clientId"] if client_id is not None
+    }
+    metadata = {
+        metadata_key(title, artist, album)
+        for title, artist, album in zip(
+            store.strings["title"], store.strings["artist"], store.strings["album"]
+        )
+        if title
+    }
+    return client_ids, metadata
+
+
+def metadata_key(title, artist, album):
+    return tuple((value or "").strip().lower() for value in (title, artist, album))
+
+
+def audio_files(directory):
+    for parent, directories, files in os.walk(directory):
+        directories.sort()
+        for name in sorted(files):
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                yield os.path.join(parent, name)
+
+
+def content_hash(path):
+    from gmusicapi.protocol.musicmanager import UploadMetadata
+
+    return UploadMetadata.get_track_clientid(path)
+
+
+def read_metadata(path):
+    import mutagen
+
+    audio = mutagen.File(path, easy=True)
+    if audio is None or not audio.get("title"):
+        return None
+
+    return metadata_key(
+        audio["title"][0],
+        (audio.get("artist") or [None])[0],
+        (audio.get("album") or [None])[0],
+    )
@@ -0,0 +1,316 @@
+import hashlib
+import json
+
+from flask import Response, current_app, request
+from flask_graphql import GraphQLView
+from graphql import GraphQLError
+from graphql.language import ast
+from graphql.utils.get_operation_ast import get_operation_ast
+from graphql_server import HttpQueryError, get_graphql_params, json_encode
+
+from . import db
+from .art import ArtError, ArtUnavailable
+from .cost import QueryCostError
+from .loaders import Loaders
+from .metrics import ResolverTimer, Trace
+from .schema import get_schema
+
+
+ART_MAX_AGE = 365 * 24 * 60 * 60
+UNCACHEABLE_FIELDS = frozenset(["uploadJob"])
+
+
+class MusicGraphQLView(GraphQLView):
+    persisted_queries = None
+    response_cache = None
+    metrics = None
+    query_cost = None
+    trace = None
+    batched = False
+    costs = ()
+    documents = ()
+
+    @property
+    def schema(self):
+        return get_schema()
+
+    def get_context(self):
+        return {
+            "request": request,
+            "loaders": Loaders(lambda ready: db.get_db().get_library(ready)),
+            "uploads": current_app.extensions["uploader"].bind(db.get_db),
+            "album_art": current_app.extensions["album_art"],
+        }
+
+    def get_middleware(self):
+        histogram = resolver_histogram(self.metrics)
+        if histogram is None and self.trace is None:
+            return None
+
+        return ResolverTimer(histogram, self.trace).middleware()
+
+    def encode(self, data, pretty=False):
+        if isinstance(data, dict):
+            data = self.add_extensions(data, None if self.batched else 0)
+        elif isinstance(data, (list, tuple)):
+            data = [
+                self.add_extensions(result, index) for index, result in enumerate(data)
+            ]
+
+        return json_encode(data, pretty)
+
+    def add_extensions(self, data, index):
+        extensions = {}
+        if index is None:
+            if any(cost is not None for cost in self.costs):
+                extensions["cost"] = list(self.costs)
+        elif index < len(self.costs) and self.costs[index] is not None:
+            extensions["cost"] = self.costs[index]
+        if self.trace is not None:
+            extensions["tracing"] = self.trace.to_dict(self.get_operation(index))
+        if not extensions:
+            return data
+
+        return dict(data, extensions=extensions)
+
+    def dispatch_request(self):
+        if request.headers.get("X-GraphQL-Trace"):
+            self.trace = Trace()
+        self.documents = self.parse_documents()
+
+        self.costs, errors = self.get_costs()
+        if errors:
+            return Response(
+                self.encode({"errors": [self.format_error(e) for e in errors]}),
+                status=400,
+                content_type="application/json",
+            )
+
+        etag = self.get_etag()
+        if etag is None:
+            return super().dispatch_request()
+
+        if etag in request.if_none_match:
+            return Response(status=304, headers={"ETag": '"{}"'.format(etag)})
+
+        body = self.response_cache.get(etag)
+        if body is None:
+            response = super().dispatch_request()
+            if response.status_code != 200 or has_errors(response.get_json()):
+                return response
+            body = response.get_data()
+            self.response_cache.set(etag, body)
+
+        response = Response(body, status=200, content_type="application/json")
+        response.set_etag(etag)
+        return response
+
+    def get_etag(self):
+        if (
+            self.response_cache is None
+            or self.trace is not None
+            or self.should_display_graphiql()
+        ):
+            return None
+
+        if not self.documents or any(
+            parsed is None
+            or parsed[1].get_operation_type(parsed[0].operation_name) != "query"
+            or UNCACHEABLE_FIELDS & root_fields(parsed[1], parsed[0].operation_name)
+            for parsed in self.documents
+        ):
+            return None
+
+        if "Mobile-Client-Authorization" not in request.headers:
+            return None
+        try:
+            database = db.get_db()
+        except (KeyError, ValueError):
+            return None
+        if database.account is None:
+            return None
+        library = database.get_library(lambda library: True)
+        if not library.complete:
+            return None
+        version = library.version
+
+        return hashlib.sha256(
+            json.dumps(
+                [
+                    database.account,
+                    version,
+                    self.batched,
+                    [
+                        [document.normalized, params.variables, params.operation_name]
+                        for params, document in self.documents
+                    ],
+                ],
+                sort_keys=True,
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def get_costs(self):
+        if self.query_cost is None or not any(self.documents):
+            return [None] * len(self.documents), []
+
+        library = db.cached_library(current_app, request.headers)
+        costs = []
+        errors = []
+        for index, parsed in enumerate(self.documents):
+            if parsed is None:
+                costs.append(None)
+                continue
+            params, document = parsed
+            try:
+                costs.append(
+                    self.query_cost.check(
+                        self.schema,
+                        document.document_ast,
+                        params.variables,
+                        params.operation_name,
+                        library,
+                    )
+                )
+            except QueryCostError as e:
+                costs.append(e.cost)
+                errors.append(e if not self.batched else batch_error(index, e))
+
+        if not errors and self.batched:
+            try:
+                self.query_cost.check_total(costs)
+            except QueryCostError as e:
+                errors.append(e)
+        return costs, errors
+
+    def get_operation(self, index):
+        if not self.batched or index is None or self.documents[index] is None:
+            return None
+
+        params, document = self.documents[index]
+        return get_operation_ast(document.document_ast, params.operation_name)
+
+    def parse_documents(self):
+        try:
+            data = self.parse_body()
+        except (HttpQueryError, GraphQLError):
+            return []
+        self.batched = self.batch and isinstance(data, list)
+        if not self.batched:
+            return [self.parse_document(data, request.args)]
+
+        return [self.parse_document(entry, {}) for entry in data]
+
+    def parse_document(self, data, query_data):
+        try:
+            if not isinstance(data, dict) and not hasattr(data, "get"):
+                return None
+            params = get_graphql_params(data, query_data)
+            if params.query is None:
+                return None
+            document = self.get_backend().document_from_string(
+                self.schema, params.query
+            )
+        except (HttpQueryError, GraphQLError):
+            return None
+        if document.errors:
+            return None
+
+        return params, document
+
+    def parse_body(self):
+        data = super().parse_body()
+        if request.method.lower() == "get" and "extensions" in request.args:
+            data = request.args
+
+        if self.persisted_queries is None:
+            return data
+        if isinstance(data, list):
+            return [self.resolve_persisted_query(params) for params in data]
+        return self.resolve_persisted_query(data)
+
+    def resolve_persisted_query(self, params):
+        if not hasattr(params, "get") or "extensions" not in params:
+            return params
+
+        params = {key: params.get(key) for key in params}
+        if isinstance(params["extensions"], str):
+            try:
+                params["extensions"] = json.loads(params["extensions"])
+            except ValueError:
+                raise HttpQueryError(400, "Extensions are invalid JSON.")
+
+        return self.persisted_queries.resolve(params)
+
+
+def root_fields(document, operation_name):
+    operation = get_operation_ast(document.document_ast, operation_name)
+    if operation is None:
+        return set()
+    fragments = {
+        definition.name.value: definition
+        for definition in document.document_ast.definitions
+        if isinstance(definition, ast.FragmentDefinition)
+    }
+
+    names = set()
+    selection_sets = [operation.selection_set]
+    visited = set()
+    while selection_sets:
+        for selection in selection_sets.pop().selections:
+            if isinstance(selection, ast.Field):
+                names.add(selection.name.value)
+            elif isinstance(selection, ast.InlineFragment):
+                selection_sets.append(selection.selection_set)
+            elif selection.name.value not in visited:
+                visited.add(selection.name.value)
+                fragment = fragments.get(selection.name.value)
+                if fragment is not None:
+                    selection_sets.append(fragment.selection_set)
+
+    return names
+
+
+def has_errors(body):
+    if isinstance(body, list):
+        return any("errors" in result for result in body)
+
+    return "errors" in body
+
+
+def batch_error(index, error):
+    return QueryCostError("Operation {}: {}".format(index, error.message), error.cost)
+
+
+def metrics():
+    return Response(
+        current_app.extensions["metrics"].render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+def album_art(album):
+    try:
+        data, mimetype = current_app.extensions["album_art"].get(
+            album, request.args.get("size", type=int)
+        )
+    except ArtError as e:
+        return Response(str(e), status=404, content_type="text/plain")
+    except ArtUnavailable as e:
+        current_app.logger.warning("Fetching album art failed: %s", e)
+        return Response("Album art is unavailable.", status=502)
+
+    response = Response(data, content_type=mimetype)
+    response.cache_control.public = True
+    response.cache_control.max_age = ART_MAX_AGE
+    response.cache_control.immutable = True
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def resolver_histogram(metrics):
+    if metrics is None:
+        return None
+
+    return metrics.histogram(
+        "music_service_resolver_seconds", "Time spent in GraphQL field resolvers."
+    )
@@ -0,0 +1,168 @@
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+from pytest import fixture, raises
+from werkzeug.datastructures import Headers
+
+from music_service import create_app
+from music_service.art import ArtCache, ArtError
+
+
+def image(width=600, height=400, format="PNG"):
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(output, format=format)
+    return output.getvalue()
+
+
+@fixture
+def origin():
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            if self.path == "/missing":
+                self.send_error(404)
+                return
+            if self.path == "/redirect":
+                self.send_response(302)
+                self.send_header("Location", "/cover.png")
+                self.end_headers()
+                return
+            body = image()
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.requests = requests
+    server.url = "http://127.0.0.1:{}".format(server.server_port)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_art_is_fetched_once_and_resized(app, client, origin):
+    art = app.extensions["album_art"]
+    url = art.url(origin.url + "/cover.png", 100)
+    assert url.endswith("?size=128")
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content_type == "image/jpeg"
+    assert Image.open(io.BytesIO(response.data)).size == (128, 85)
+    assert response.cache_control.public
+    assert response.cache_control.max_age == 365 * 24 * 60 * 60
+
+    assert client.get(art.url(origin.url + "/cover.png", 64)).status_code == 200
+    original = client.get(art.url(origin.url + "/cover.png"))
+    assert original.content_type == "image/png"
+    assert Image.open(io.BytesIO(original.data)).size == (600, 400)
+    assert origin.requests == ["/cover.png"]
+
+    response = client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+
+
+def test_unknown_art_is_not_proxied(app, client, origin):
+    art = app.extensions["album_art"]
+
+    assert client.get("/art/" + origin.url).status_code == 404
+    assert (
+        client.get(art.url(origin.url + "/cover.png") + "?size=99").status_code == 404
+    )
+    assert client.get(art.url(origin.url + "/missing")).status_code == 502
+    assert origin.requests == ["/missing"]
+
+
+def test_cache_is_bounded_and_survives_restarts(tmp_path, origin):
+    art = ArtCache(
+        str(tmp_path), "secret", hosts=["127.0.0.1"], max_bytes=len(image()) * 2
+    )
+    for name in ("a", "b", "c"):
+        art.get(art.serializer.dumps("{}/{}.png".format(origin.url, name)))
+    assert len(art) == 2
+
+    restarted = ArtCache(
+        str(tmp_path), "secret", hosts=["127.0.0.1"], max_bytes=len(image()) * 2
+    )
+    restarted.get(restarted.serializer.dumps(origin.url + "/c.png"))
+    assert origin.requests == ["/a.png", "/b.png", "/c.png"]
+
+    with raises(ArtError):
+        ArtCache(str(tmp_path), "other", hosts=["127.0.0.1"]).get(
+            art.serializer.dumps(origin.url)
+        )
+
+
+def test_album_art_field_returns_proxied_url(app, client, monkeypatch, credentials):
+    monkeypatch.setattr(
+        "gmusicapi.Mobileclient.get_all_songs",
+        lambda *args: [
+            {
+                "id": 1,
+                "title": "Song",
+                "album": "Album",
+                "albumArtRef": [{"url": "http://art.example/cover.png"}],
+            }
+        ],
+    )
+
+    with app.app_context():
+        response = client.post(
+            "/graphql",
+            json={"query": "{ albums { albumArt(size: 200) } }"},
+            headers=Headers({"Mobile-Client-Authorization": credentials()}),
+        )
+
+    url = response.get_json()["data"]["albums"][0]["albumArt"]
+    token = url[len("/art/") : -len("?size=256")]
+    assert url.endswith("?size=256")
+    assert app.extensions["album_art"].serializer.loads(token) == (
+        "http://art.example/cover.png"
+    )
+
+
+def test_art_is_only_fetched_from_allowed_hosts(app, client, origin):
+    art = app.extensions["album_art"]
+
+    for url in (
+        "http://169.254.169.254/latest/meta-data",
+        "http://127.0.0.1.evil.example/cover.png",
+        "file:///etc/passwd",
+    ):
+        assert client.get(art.url(url)).status_code == 404
+    assert origin.requests == []
+
+    google = ArtCache(art.directory, "secret")
+    assert google.allows("https://lh3.googleusercontent.com/cover")
+    assert google.allows("http://lh5.ggpht.com/cover")
+    assert not google.allows("http://googleusercontent.com.evil.example/cover")
+
+
+def test_art_redirects_are_not_followed(app, client, origin):
+    art = app.extensions["album_art"]
+
+    assert client.get(art.url(origin.url + "/redirect")).status_code == 502
+    assert origin.requests == ["/redirect"]
+
+
+def test_art_requires_a_secret_outside_testing(tmp_path):
+    directory = str(tmp_path / "art")
+    app = create_app({"ALBUM_ART_DIR": directory})
+    assert app.extensions["album_art"] is None
+    assert "album_art" not in app.view_functions
+
+    for config in ({"ALBUM_ART_SECRET": "art"}, {"SECRET_KEY": "production"}):
+        app = create_app(dict(config, ALBUM_ART_DIR=directory))
+        assert app.extensions["album_art"] is not None
+        assert "album_art" in app.view_functions
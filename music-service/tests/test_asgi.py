@@ -0,0 +1,166 @@
+import asyncio
+import io
+import json
+import threading
+
+from PIL import Image
+
+from music_service.asgi import AsyncGraphQLApp
+
+library = [{"id": 1, "title": "Song 1", "album": "Album 1"}]
+
+
+def request(app, **kwargs):
+    status, _, body = raw_request(app, **kwargs)
+    return status, json.loads(body)
+
+
+def raw_request(
+    app, method="POST", path="/graphql", body=b"", query_string=b"", headers=()
+):
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query_string,
+        "headers": [(b"content-type", b"application/json")] + list(headers),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"], dict(sent[0]["headers"]), sent[1]["body"]
+
+
+def test_query_is_executed(app, monkeypatch):
+    threads = []
+
+    def get_all_songs(self):
+        threads.append(threading.current_thread())
+        return library
+
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", get_all_songs)
+    status, body = request(
+        AsyncGraphQLApp(app),
+        body=json.dumps(
+            {"query": "{ songs { title album { name tracks { title } } } }"}
+        ).encode(),
+    )
+
+    assert threads and threads[0] is not threading.main_thread()
+    assert status == 200
+    assert body["data"] == {
+        "songs": [
+            {
+                "title": "Song 1",
+                "album": {"name": "Album 1", "tracks": [{"title": "Song 1"}]},
+            }
+        ]
+    }
+
+
+def test_get_query_is_executed(app, monkeypatch):
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", lambda *args: library)
+    status, body = request(
+        AsyncGraphQLApp(app), method="GET", query_string=b"query={songs{title}}"
+    )
+
+    assert status == 200
+    assert body["data"] == {"songs": [{"title": "Song 1"}]}
+
+
+def test_invalid_requests_are_rejected(app):
+    asgi = AsyncGraphQLApp(app)
+
+    assert request(asgi, body=b"{")[0] == 400
+    assert request(asgi, body=b"{}")[0] == 400
+    assert request(asgi, method="PUT")[0] == 405
+    assert raw_request(asgi, path="/other")[0] == 404
+    assert request(asgi, body=b'{"query": "{ songs { missing } }"}')[0] == 400
+
+
+def test_malformed_credentials_are_rejected(app):
+    status, body = request(
+        AsyncGraphQLApp(app),
+        body=b'{"query": "{ songs { title } }"}',
+        headers=[(b"mobile-client-authorization", b"{}")],
+    )
+
+    assert status == 400
+    assert body["errors"]
+
+
+def test_expensive_queries_are_rejected(app):
+    app.extensions["query_cost"].max_depth = 2
+    status, body = request(
+        AsyncGraphQLApp(app), body=b'{"query": "{ albums { artist { name } } }"}',
+    )
+
+    assert status == 400
+    assert body["errors"][0]["message"].startswith("Query depth 3 exceeds")
+    assert body["extensions"]["cost"]["depth"] == 3
+
+
+def test_batched_operations_share_one_library_fetch(app, monkeypatch):
+    calls = []
+
+    def get_all_songs(self):
+        calls.append(self)
+        return library
+
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", get_all_songs)
+    status, body = request(
+        AsyncGraphQLApp(app),
+        body=json.dumps(
+            [{"query": "{ songs { title } }"}, {"query": "{ albums { name } }"}]
+        ).encode(),
+    )
+
+    assert status == 200
+    assert [result["data"] for result in body] == [
+        {"songs": [{"title": "Song 1"}]},
+        {"albums": [{"name": "Album 1"}]},
+    ]
+    assert len(calls) == 1
+    assert request(AsyncGraphQLApp(app), body=b"[]")[0] == 400
+
+
+def test_album_art_and_metrics_are_served(app, monkeypatch):
+    cover = io.BytesIO()
+    Image.new("RGB", (600, 400), "red").save(cover, format="PNG")
+    fetched = []
+
+    def fetch(self, art_url):
+        fetched.append(art_url)
+        return cover.getvalue()
+
+    monkeypatch.setattr("music_service.art.ArtCache._fetch", fetch)
+    monkeypatch.setattr(
+        "gmusicapi.Mobileclient.get_all_songs",
+        lambda *args: [
+            dict(library[0], albumArtRef=[{"url": "http://art.example/cover.png"}])
+        ],
+    )
+    asgi = AsyncGraphQLApp(app)
+    status, body = request(
+        asgi, body=b'{"query": "{ albums { albumArt(size: 100) } }"}'
+    )
+    path, query_string = body["data"]["albums"][0]["albumArt"].split("?")
+
+    status, headers, content = raw_request(
+        asgi, method="GET", path=path, query_string=query_string.encode()
+    )
+    assert status == 200
+    assert headers[b"content-type"] == b"image/jpeg"
+    assert Image.open(io.BytesIO(content)).size == (128, 85)
+    assert fetched == ["http://art.example/cover.png"]
+
+    status, headers, content = raw_request(asgi, method="GET", path="/metrics")
+    assert status == 200
+    assert b"music_service_upstream_seconds" in content
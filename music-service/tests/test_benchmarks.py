@@ -0,0 +1,66 @@
+from collections import Counter
+
+from benchmarks.startup import measure
+from benchmarks.synthetic import generate_library
+from benchmarks.workload import compare, main, run_workload
+from music_service.library import Library
+
+
+def test_synthetic_library_is_deterministic_and_skewed():
+    songs = generate_library(2000, seed=1)
+
+    assert songs == generate_library(2000, seed=1)
+    assert songs != generate_library(2000, seed=2)
+    assert len({song["id"] for song in songs}) == 2000
+
+    artists = Counter(song["albumArtist"] for song in songs if "albumArtist" in song)
+    counts = sorted(artists.values(), reverse=True)
+    assert counts[0] > 5 * counts[len(counts) // 2]
+    assert any("album" not in song for song in songs)
+    assert any("year" not in song for song in songs)
+    assert any("trackNumber" not in song for song in songs)
+
+
+def test_workload_reports_latency_and_allocations():
+    results = run_workload(Library(generate_library(200)), iterations=3)
+
+    for result in results.values():
+        assert 0 < result["p50"] <= result["p90"] <= result["p99"]
+        assert result["peak_bytes"] > 0
+
+
+def test_regressions_are_detected_against_baseline(tmp_path, capsys):
+    baseline = {"songs": {"p50": 1.0, "p90": 1.0, "p99": 1.0, "peak_bytes": 100}}
+
+    assert compare(baseline, baseline) == []
+    assert compare({"songs": dict(baseline["songs"], p50=2.0)}, baseline) == [
+        ("songs", "p50", 1.0, 2.0)
+    ]
+
+    path = str(tmp_path / "baseline.json")
+    assert main(["--songs", "100", "--iterations", "2", "--save", path]) == 0
+    assert (
+        main(
+            [
+                "--songs",
+                "100",
+                "--iterations",
+                "2",
+                "--compare",
+                path,
+                "--tolerance",
+                "1000",
+            ]
+        )
+        == 0
+    )
+    assert "100 songs" in capsys.readouterr().out
+
+
+def test_first_request_does_not_load_upstream_clients():
+    result = measure(runs=2)
+
+    assert result["upstream_modules"] == []
+    assert 0 < result["import"] <= result["boot"] <= result["first_request"]
+    assert result["import"] < 1.5
+    assert result["first_request"] < 2.0
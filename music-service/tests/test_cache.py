@@ -0,0 +1,56 @@
+from music_service.cache import LRUCache
+
+
+class Clock:
+    now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_returns_stored_value():
+    cache = LRUCache()
+    cache.set("account", [{"id": 1}])
+
+    assert cache.get("account") == [{"id": 1}]
+    assert cache.get("other") is None
+
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = LRUCache(ttl=10, clock=clock)
+    cache.set("account", [])
+
+    clock.now = 9
+    assert cache.get("account") == []
+
+    clock.now = 10
+    assert cache.get("account") is None
+    assert cache.peek("account") == []
+    assert cache.age("account") == 10
+    assert cache.age("other") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+
+
+def test_invalidate_removes_entry():
+    cache = LRUCache()
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    cache.invalidate("a")
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+    cache.clear()
+    assert len(cache) == 0
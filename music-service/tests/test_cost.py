@@ -0,0 +1,134 @@
+from graphql import parse
+from pytest import raises
+
+from music_service.cost import QueryCost, QueryCostError, cardinalities
+from music_service.library import Library
+from music_service.schema import schema
+
+library = Library(
+    [
+        {
+            "id": 1,
+            "title": "Song 1",
+            "album": "Album 1",
+            "albumArtist": "Artist 1",
+            "artist": "A",
+        },
+        {
+            "id": 2,
+            "title": "Song 2",
+            "album": "Album 1",
+            "albumArtist": "Artist 1",
+            "artist": "A",
+        },
+        {
+            "id": 3,
+            "title": "Song 3",
+            "album": "Album 2",
+            "albumArtist": "Artist 1",
+            "artist": "A",
+        },
+        {
+            "id": 4,
+            "title": "Song 4",
+            "album": "Album 3",
+            "albumArtist": "Artist 2",
+            "artist": "B",
+        },
+    ]
+)
+
+
+def check(query, variables=None, **limits):
+    return QueryCost(**limits).check(schema, parse(query), variables, library=library)
+
+
+def test_lists_are_multiplied_by_library_cardinalities():
+    assert cardinalities(library)["RootQuery.songs"] == 4
+    assert cardinalities(library)["Album.tracks"] == 2
+    assert cardinalities(library)["Artist.albums"] == 2
+
+    assert check("{ songs { id title } }") == {
+        "requested": 1 + 4 * 2,
+        "maximum": 1000000,
+        "depth": 2,
+    }
+    assert check("{ artists { albums { tracks { title } } } }")["requested"] == (
+        1 + 2 * (1 + 2 * (1 + 2 * 1))
+    )
+
+
+def test_first_arguments_bound_list_sizes():
+    assert check("{ songs(first: 2) { title } }")["requested"] == 1 + 2
+    assert check("{ songs(first: 50) { title } }")["requested"] == 1 + 4
+    assert (
+        check("query ($first: Int) { songs(first: $first) { title } }", {"first": 1})[
+            "requested"
+        ]
+        == 1 + 1
+    )
+    assert check("{ songsConnection(first: 3) { edges { node { title } } } }")[
+        "requested"
+    ] == 1 + (1 + 3 * (1 + 1))
+
+
+def test_fragments_are_counted_and_introspection_is_free():
+    assert check(
+        "{ songs { ...fields } } fragment fields on Song { title __typename }"
+    ) == check("{ songs { title } }")
+    assert check("{ __schema { types { name fields { name } } } }")["requested"] == 0
+
+
+def test_expensive_and_deep_queries_are_rejected():
+    with raises(QueryCostError) as error:
+        check("{ songs { id title } }", max_cost=5)
+    assert "cost 9 exceeds the maximum cost of 5" in str(error.value)
+    assert error.value.cost["requested"] == 9
+
+    with raises(QueryCostError) as error:
+        check(
+            "{ albums { artist { albums { tracks { album { name } } } } } }",
+            max_depth=4,
+        )
+    assert "depth 6 exceeds the maximum depth of 4" in str(error.value)
+
+
+def test_view_reports_and_enforces_cost(app, client, monkeypatch):
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", lambda self: [])
+    app.extensions["query_cost"].max_cost = 6000
+
+    with app.app_context():
+        response = client.post("/graphql", json={"query": "{ songs { title } }"})
+    assert response.status_code == 200
+    assert response.get_json()["extensions"]["cost"]["requested"] == 5001
+
+    with app.app_context():
+        response = client.post(
+            "/graphql",
+            json={"query": "{ albums { tracks { title } artist { name } } }"},
+        )
+    assert response.status_code == 400
+    assert response.get_json()["errors"][0]["message"].startswith("Query cost")
+    assert response.get_json()["extensions"]["cost"]["maximum"] == 6000
+
+
+def test_batches_are_limited_per_operation_and_in_total(app, client, monkeypatch):
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", lambda self: [])
+    app.extensions["query_cost"].max_cost = 6000
+    cheap = {"query": "{ songs { title } }"}
+
+    with app.app_context():
+        response = client.post(
+            "/graphql",
+            json=[cheap, {"query": "{ albums { tracks { title } artist { name } } }"}],
+        )
+    assert response.status_code == 400
+    assert response.get_json()["errors"][0]["message"].startswith(
+        "Operation 1: Query cost"
+    )
+    assert response.get_json()["extensions"]["cost"][0]["requested"] == 5001
+
+    with app.app_context():
+        response = client.post("/graphql", json=[cheap, cheap])
+    assert response.status_code == 400
+    assert response.get_json()["errors"][0]["message"].startswith("Batch cost 10002")
@@ -1,9 +1,13 @@
-import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
 from pytest import fixture
 from werkzeug.datastructures import Headers
 
-from music_service.db import get_db
+from music_service.db import SingleFlight, get_db
+from music_service.library import Library
 
 
 class CallRecorder:
@@ -18,7 +22,7 @@ def test_connection_is_idempotent(app):
         assert get_db() is get_db()
 
 
-def test_connection_logs_in(app, monkeypatch):
+def test_connection_logs_in(app, monkeypatch, credentials):
     mobile_client_recorder = CallRecorder()
     music_manager_recorder = CallRecorder()
 
@@ -29,17 +33,7 @@ def test_connection_logs_in(app, monkeypatch):
     )
     monkeypatch.setattr("gmusicapi.Musicmanager.login", music_manager_recorder.function)
 
-    cred = json.dumps(
-        {
-            "accessToken": "",
-            "clientId": "",
-            "clientSecret": "",
-            "refreshToken": "",
-            "tokenExpiry": 0,
-            "tokenUri": "",
-            "userAgent": "",
-        }
-    )
+    cred = credentials()
     with app.test_request_context(
         headers=Headers(
             {"Mobile-Client-Authorization": cred, "Music-Manager-Authorization": cred}
@@ -56,7 +50,16 @@ def test_get_songs_returns_songs(app, monkeypatch):
         "gmusicapi.Mobileclient.get_all_songs", lambda self: [{"id": 1}]
     )
     with app.app_context():
-        assert get_db().get_songs() == [{"id": 1}]
+        assert list(get_db().get_songs()) == [{"id": 1}]
+
+
+def test_get_songs_skips_deleted_tracks(app, monkeypatch):
+    monkeypatch.setattr(
+        "gmusicapi.Mobileclient.get_all_songs",
+        lambda self: [{"id": 1}, {"id": 2, "deleted": True}],
+    )
+    with app.app_context():
+        assert list(get_db().get_songs()) == [{"id": 1}]
 
 
 def test_get_songs_is_idempotent(app, monkeypatch):
@@ -67,6 +70,122 @@ def test_get_songs_is_idempotent(app, monkeypatch):
         assert get_db().get_songs() is get_db().get_songs()
 
 
+def test_get_songs_is_cached_across_requests(app, monkeypatch, credentials):
+    recorder = CallRecorder()
+
+    def get_all_songs(self):
+        recorder.function()
+        return [{"id": 1}]
+
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", get_all_songs)
+    headers = Headers({"Mobile-Client-Authorization": credentials("token")})
+
+    with app.app_context(), app.test_request_context(headers=headers):
+        songs = get_db().get_songs()
+    recorder.called = False
+
+    with app.app_context(), app.test_request_context(headers=headers):
+        assert get_db().get_songs() is songs
+    assert not recorder.called
+
+    with app.app_context(), app.test_request_context(headers=headers):
+        get_db().invalidate_songs()
+        assert list(get_db().get_songs()) == [{"id": 1}]
+    assert recorder.called
+
+
+def test_get_songs_cache_is_per_account(app, monkeypatch, credentials):
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", lambda self: [])
+    with app.app_context(), app.test_request_context(
+        headers=Headers({"Mobile-Client-Authorization": credentials("first")})
+    ):
+        first = get_db().get_songs()
+
+    with app.app_context(), app.test_request_context(
+        headers=Headers({"Mobile-Client-Authorization": credentials("second")})
+    ):
+        assert get_db().get_songs() is not first
+
+
+def test_expired_library_is_synced_incrementally(app, monkeypatch, credentials):
+    updates = []
+
+    def get_all_songs(self, updated_after=None):
+        updates.append(updated_after)
+        if updated_after is None:
+            return [{"id": 1, "title": "One"}, {"id": 2, "title": "Two"}]
+        return [{"id": 2, "deleted": True}, {"id": 3, "title": "Three"}]
+
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", get_all_songs)
+    app.extensions["library_cache"].ttl = 0
+    headers = Headers({"Mobile-Client-Authorization": credentials("token")})
+
+    with app.app_context(), app.test_request_context(headers=headers):
+        first = get_db().get_library()
+
+    with app.app_context(), app.test_request_context(headers=headers):
+        assert list(get_db().get_songs()) == [
+            {"id": 1, "title": "One"},
+            {"id": 3, "title": "Three"},
+        ]
+
+    assert updates[0] is None
+    assert updates[1] < first.synced_at
+
+
+def test_library_is_restored_from_snapshot(app, monkeypatch, credentials):
+    updates = []
+    clients = []
+
+    def get_all_songs(self, updated_after=None):
+        updates.append(updated_after)
+        clients.append(self)
+        return [{"id": 2, "title": "Two"}]
+
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", get_all_songs)
+    headers = Headers({"Mobile-Client-Authorization": credentials("token")})
+    with app.app_context(), app.test_request_context(headers=headers):
+        account = get_db().account
+    app.extensions["library_snapshots"].save(
+        account,
+        Library(
+            [{"id": 1, "title": "One"}],
+            synced_at=datetime(2020, 4, 1, tzinfo=timezone.utc),
+        ),
+    )
+
+    with app.app_context(), app.test_request_context(headers=headers):
+        assert list(get_db().get_songs()) == [{"id": 1, "title": "One"}]
+        request_client = get_db().mobile_client
+
+    app.extensions["library_refresher"].shutdown(wait=True)
+    assert len(updates) == 1 and updates[0] is not None
+    assert clients[0] is not request_client
+    assert list(app.extensions["library_cache"].get(account).songs) == [
+        {"id": 1, "title": "One"},
+        {"id": 2, "title": "Two"},
+    ]
+    assert len(app.extensions["library_snapshots"].load(account).songs) == 2
+
+
+def test_failed_reconcile_is_logged(app, monkeypatch, credentials, caplog):
+    def get_all_songs(self, updated_after=None):
+        raise RuntimeError("upstream failed")
+
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", get_all_songs)
+    headers = Headers({"Mobile-Client-Authorization": credentials("token")})
+    with app.app_context(), app.test_request_context(headers=headers):
+        account = get_db().account
+    library = Library([{"id": 1}], synced_at=datetime(2020, 4, 1, tzinfo=timezone.utc))
+    app.extensions["library_snapshots"].save(account, library)
+
+    with app.app_context(), app.test_request_context(headers=headers):
+        assert list(get_db().get_songs()) == [{"id": 1}]
+
+    app.extensions["library_refresher"].shutdown(wait=True)
+    assert "Background library refresh failed" in caplog.text
+
+
 def test_connection_closes_after_request(app, monkeypatch):
     mobile_client_recorder = CallRecorder()
     music_manager_recorder = CallRecorder()
@@ -88,3 +207,92 @@ def test_connection_closes_after_request(app, monkeypatch):
 
     assert mobile_client_recorder.called
     assert music_manager_recorder.called
+
+
+def test_authenticated_connection_is_pooled_after_request(
+    app, monkeypatch, credentials
+):
+    recorder = CallRecorder()
+    monkeypatch.setattr("gmusicapi.Mobileclient.logout", recorder.function)
+    headers = Headers({"Mobile-Client-Authorization": credentials("token")})
+
+    with app.app_context(), app.test_request_context(headers=headers):
+        db = get_db()
+
+    with app.app_context(), app.test_request_context(headers=headers):
+        assert get_db() is db
+
+    assert not recorder.called
+
+
+def wait_until(predicate):
+    deadline = time.monotonic() + 5
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert predicate()
+
+
+def test_single_flight_shares_results_and_errors():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def call(result):
+        calls.append(result)
+        release.wait()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(flights.do, "key", lambda: call(1))]
+        wait_until(lambda: calls == [1])
+        futures += [
+            executor.submit(flights.do, "key", lambda: call(2)) for _ in range(3)
+        ]
+        wait_until(lambda: flights.waiters("key") == 3)
+        release.set()
+        assert [future.result() for future in futures] == [1, 1, 1, 1]
+    assert calls == [1]
+
+    release.clear()
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        error = ValueError("upstream failed")
+        futures = [executor.submit(flights.do, "key", lambda: call(error))]
+        wait_until(lambda: calls == [1, error])
+        futures += [
+            executor.submit(flights.do, "key", lambda: call(3)) for _ in range(2)
+        ]
+        wait_until(lambda: flights.waiters("key") == 2)
+        release.set()
+        for future in futures:
+            assert future.exception() is error
+    assert flights.waiters("key") == 0
+
+
+def test_concurrent_requests_share_one_library_fetch(app, monkeypatch, credentials):
+    release = threading.Event()
+    calls = []
+
+    def get_all_songs(self):
+        calls.append(self)
+        release.wait()
+        return [{"id": 1}]
+
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", get_all_songs)
+    headers = Headers({"Mobile-Client-Authorization": credentials()})
+    with app.app_context(), app.test_request_context(headers=headers):
+        key = ("sync", get_db().account)
+
+    def request():
+        with app.app_context(), app.test_request_context(headers=headers):
+            return get_db().get_library()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(request) for _ in range(4)]
+        wait_until(lambda: app.extensions["library_flights"].waiters(key) == 3)
+        release.set()
+        libraries = [future.result() for future in futures]
+
+    assert len(calls) == 1
+    assert all(library is libraries[0] for library in libraries)
@@ -0,0 +1,54 @@
+from music_service.documents import DocumentCache, query_hash
+from music_service.schema import schema
+
+
+def test_documents_are_parsed_once():
+    cache = DocumentCache()
+
+    document = cache.document_from_string(schema, "{ songs { title } }")
+    assert cache.document_from_string(schema, "{ songs { title } }") is document
+    assert len(cache) == 1
+
+
+def test_least_recently_used_document_is_evicted():
+    cache = DocumentCache(max_entries=1)
+    first = cache.document_from_string(schema, "{ songs { title } }")
+    cache.document_from_string(schema, "{ albums { name } }")
+
+    assert cache.document_from_string(schema, "{ songs { title } }") is not first
+
+
+def test_invalid_documents_return_validation_errors():
+    document = DocumentCache().document_from_string(schema, "{ songs { missing } }")
+    result = document.execute()
+
+    assert result.invalid
+    assert "missing" in result.errors[0].message
+
+
+def test_persisted_query_is_registered_and_reused(client, monkeypatch):
+    monkeypatch.setattr(
+        "gmusicapi.Mobileclient.get_all_songs", lambda *args: [{"id": 1, "title": "A"}]
+    )
+    query = "{ songs { title } }"
+    extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_hash(query)}}
+
+    response = client.post("/graphql", json={"extensions": extensions})
+    assert response.get_json()["errors"][0]["message"] == "PersistedQueryNotFound"
+
+    response = client.post("/graphql", json={"query": query, "extensions": extensions})
+    assert response.get_json()["data"] == {"songs": [{"title": "A"}]}
+
+    response = client.post("/graphql", json={"extensions": extensions})
+    assert response.get_json()["data"] == {"songs": [{"title": "A"}]}
+
+
+def test_persisted_query_hash_must_match(client):
+    response = client.post(
+        "/graphql",
+        json={
+            "query": "{ songs { title } }",
+            "extensions": {"persistedQuery": {"version": 1, "sha256Hash": "0"}},
+        },
+    )
+    assert response.status_code == 400
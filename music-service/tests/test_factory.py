@@ -1,6 +1,16 @@
-from music_service import create_app
+import sys
+
+from music_service import create_app, schema, warm_up
 
 
 def test_config():
     assert not create_app().testing
     assert create_app({"TESTING": True}).testing
+
+
+def test_warm_up_builds_schema_and_loads_upstream_clients():
+    warm_up()
+
+    assert schema.get_schema() is schema.schema
+    assert "mutagen" in sys.modules
+    assert "PIL.Image" in sys.modules
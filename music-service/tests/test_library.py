@@ -0,0 +1,185 @@
+from music_service.library import Library
+
+songs = [
+    {
+        "id": 1,
+        "artist": "Artist 1",
+        "albumArtist": "Artist 1",
+        "album": "Album 1",
+        "totalTrackCount": 3,
+        "albumArtRef": [{"url": "fakeurl.com/album1.jpg"}],
+    },
+    {"id": 2, "artist": "Artist 2", "albumArtist": "Artist 2", "album": "Album 2"},
+    {
+        "id": 3,
+        "artist": "Artist 1",
+        "albumArtist": "Various Artists",
+        "album": "Album 1",
+        "totalTrackCount": 2,
+        "totalDiscCount": 1,
+        "albumArtRef": [{"url": ""}],
+    },
+    {
+        "id": 4,
+        "artist": "Artist 1",
+        "albumArtist": "Artist 1",
+        "album": "Album 1",
+        "totalTrackCount": 3,
+    },
+    {"id": 5, "albumArtist": "Artist 1", "album": "Album 3"},
+]
+
+
+def test_tracks_are_grouped_by_album():
+    library = Library(songs)
+
+    assert library.tracks("Album 1") == [songs[0], songs[2], songs[3]]
+    assert library.tracks("Album 2") == [songs[1]]
+    assert library.tracks("Album 4") == []
+
+
+def test_albums_are_grouped_by_album_artist():
+    library = Library(songs)
+
+    assert library.albums("Artist 1") == ["Album 1"]
+    assert library.albums("Various Artists") == ["Album 1"]
+    assert library.albums("Artist 3") == []
+
+
+def test_album_aggregates_use_most_common_value():
+    library = Library(songs)
+
+    assert library.album_artist == {
+        "Album 1": "Artist 1",
+        "Album 2": "Artist 2",
+        "Album 3": "Artist 1",
+    }
+    assert library.album_track_count == {"Album 1": 3}
+    assert library.album_disc_count == {"Album 1": 1}
+    assert library.album_art_url == {"Album 1": "fakeurl.com/album1.jpg"}
+
+
+def test_find_matches_case_insensitive_substrings():
+    library = Library(
+        [
+            {"id": 1, "title": "Hello World", "artist": "Someone"},
+            {"id": 2, "title": "Goodbye", "artist": "World Band"},
+            {"id": 3, "title": "Worlds Apart", "album": "Hello"},
+        ]
+    )
+
+    assert [song["id"] for song in library.find(search="WORLD")] == [1, 2, 3]
+    assert [song["id"] for song in library.find(search="hello")] == [1, 3]
+    assert [song["id"] for song in library.find(title="o w")] == [1]
+    assert [song["id"] for song in library.find(title="ds")] == [3]
+    assert [song["id"] for song in library.find(search="o", title="bye")] == [2]
+    assert library.find(search="missing") == []
+    assert library.find() is library.songs
+
+
+def test_updated_merges_changes():
+    library = Library(
+        [{"id": 1, "title": "One"}, {"id": 2, "title": "Two"}], synced_at=1
+    )
+    updated = library.updated(
+        [
+            {"id": 2, "title": "Deleted", "deleted": True},
+            {"id": 1, "title": "Renamed"},
+            {"id": 3, "title": "Three", "deleted": False},
+        ],
+        synced_at=2,
+    )
+
+    assert [song["title"] for song in updated.songs] == ["Renamed", "Three"]
+    assert updated.synced_at == 2
+    assert [song["title"] for song in library.songs] == ["One", "Two"]
+
+
+ordered_songs = [
+    {
+        "id": 1,
+        "title": "B",
+        "artist": "Artist 2",
+        "album": "Album 2",
+        "year": 2001,
+        "creationTimestamp": "1500000000000000",
+    },
+    {
+        "id": 2,
+        "title": "A",
+        "artist": "Artist 1",
+        "albumArtist": "Artist 1",
+        "album": "Album 1",
+        "discNumber": 1,
+        "trackNumber": 2,
+        "creationTimestamp": "1600000000000000",
+    },
+    {
+        "id": 3,
+        "title": "C",
+        "artist": "Artist 1",
+        "albumArtist": "Artist 1",
+        "album": "Album 1",
+        "discNumber": 1,
+        "trackNumber": 1,
+        "year": 1999,
+    },
+    {
+        "id": 4,
+        "title": "D",
+        "artist": "Artist 1",
+        "albumArtist": "Artist 1",
+        "album": "Album 3",
+        "year": 1999,
+        "creationTimestamp": "1400000000000000",
+    },
+]
+
+
+def test_songs_are_ordered_by_precomputed_permutations():
+    library = Library(ordered_songs)
+
+    def ids(order, **kwargs):
+        return [
+            library.songs.ids[position]
+            for position in library.ordered_songs(order, **kwargs)
+        ]
+
+    assert ids("title") == [2, 1, 3, 4]
+    assert ids("year") == [3, 4, 1, 2]
+    assert ids("artist") == [3, 2, 4, 1]
+    assert ids("recently_added") == [2, 1, 4, 3]
+    assert ids("artist", search="artist 1") == [3, 2, 4]
+    assert library.permutation("songs", "year") is library.permutation("songs", "year")
+
+
+def test_albums_and_artists_are_ordered():
+    library = Library(ordered_songs)
+
+    assert library.ordered_albums("year") == ["Album 1", "Album 3", "Album 2"]
+    assert library.ordered_albums("artist") == ["Album 2", "Album 1", "Album 3"]
+    assert library.ordered_albums("recently_added") == [
+        "Album 1",
+        "Album 2",
+        "Album 3",
+    ]
+    assert library.ordered_albums("name", search="album 3") == ["Album 3"]
+    assert library.ordered_artists("recently_added") == ["Artist 1"]
+
+
+def test_top_k_matches_full_sort():
+    library = Library(
+        [
+            {
+                "id": index,
+                "title": "Song {}".format(index % 7),
+                "year": 1990 + index % 13,
+                "creationTimestamp": str(index * 7919 % 101),
+            }
+            for index in range(200)
+        ]
+    )
+
+    for order in ("title", "year", "recently_added"):
+        full = library.ordered_songs(order, search="song")
+        assert library.ordered_songs(order, search="song", limit=5) == full[:5]
@@ -0,0 +1,80 @@
+from music_service.library import Library
+from music_service.loaders import LibraryLoader, Loaders
+
+library = Library(
+    [
+        {
+            "id": 1,
+            "title": "Song 1",
+            "artist": "Artist 1",
+            "albumArtist": "Artist 1",
+            "album": "Album 1",
+        },
+        {
+            "id": 2,
+            "title": "Song 2",
+            "artist": "Artist 2",
+            "albumArtist": "Artist 2",
+            "album": "Album 2",
+        },
+        {
+            "id": 3,
+            "title": "Song 3",
+            "artist": "Artist 1",
+            "albumArtist": "Artist 1",
+            "album": "Album 1",
+        },
+    ]
+)
+
+
+def test_loader_batches_and_deduplicates_keys():
+    batches = []
+
+    def lookup(library, album):
+        batches.append(album)
+        return len(library.tracks(album))
+
+    loader = LibraryLoader(lambda: library, lookup)
+    counts = [loader.load(album) for album in ["Album 1", "Album 2", "Album 1"]]
+
+    assert [count.get() for count in counts] == [2, 1, 2]
+    assert batches == ["Album 1", "Album 2"]
+
+
+def test_library_is_loaded_once_per_execution():
+    calls = []
+
+    def get_library(ready):
+        calls.append(ready)
+        return library
+
+    loaders = Loaders(get_library)
+    albums = [loaders.artist_albums.load(name) for name in ["Artist 1", "Artist 2"]]
+
+    assert [albums.get() for albums in albums] == [
+        [{"name": "Album 1"}],
+        [{"name": "Album 2"}],
+    ]
+    assert len(calls) == 1
+
+
+def test_nested_query_resolves_each_key_once(client, monkeypatch):
+    keys = []
+    batch_load_fn = LibraryLoader.batch_load_fn
+
+    def record(self, batch):
+        keys.extend(batch)
+        return batch_load_fn(self, batch)
+
+    monkeypatch.setattr(LibraryLoader, "batch_load_fn", record)
+    monkeypatch.setattr(
+        "gmusicapi.Mobileclient.get_all_songs", lambda *args: library.songs
+    )
+    response = client.post(
+        "/graphql",
+        data={"query": "{ songs { artist { albums { tracks { title } } } } }"},
+    )
+
+    assert "errors" not in response.get_json()
+    assert sorted(keys) == ["Album 1", "Album 2", "Artist 1", "Artist 2"]
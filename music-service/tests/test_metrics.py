@@ -0,0 +1,71 @@
+from werkzeug.datastructures import Headers
+
+from music_service.metrics import Histogram, Metrics
+
+library = [{"id": 1, "title": "Song 1", "album": "Album 1"}]
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    histogram.observe(0.05, call="get_all_songs")
+    histogram.observe(0.5, call="get_all_songs")
+    histogram.observe(5, call="get_all_songs")
+
+    assert histogram.render().splitlines() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{call="get_all_songs",le="0.1"} 1',
+        'latency_seconds_bucket{call="get_all_songs",le="1.0"} 2',
+        'latency_seconds_bucket{call="get_all_songs",le="+Inf"} 3',
+        'latency_seconds_count{call="get_all_songs"} 3',
+        'latency_seconds_sum{call="get_all_songs"} 5.55',
+    ]
+
+
+def test_histograms_are_registered_once():
+    metrics = Metrics()
+
+    assert metrics.histogram("a", "A.") is metrics.histogram("a", "A.")
+    assert "# TYPE a histogram" in metrics.render()
+
+
+def test_metrics_endpoint_reports_resolvers_and_upstream_calls(
+    app, client, monkeypatch, credentials
+):
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", lambda self: library)
+    with app.app_context():
+        client.post(
+            "/graphql",
+            json={"query": "{ songs { title album { tracks { title } } } }"},
+            headers=Headers({"Mobile-Client-Authorization": credentials()}),
+        )
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    body = response.get_data(as_text=True)
+    assert 'music_service_resolver_seconds_count{field="RootQuery.songs"} 1' in body
+    assert 'music_service_resolver_seconds_count{field="Album.tracks"} 1' in body
+    assert 'field="Song.title"' not in body
+    assert 'music_service_upstream_seconds_count{call="get_all_songs"} 1' in body
+
+
+def test_trace_is_returned_on_request(app, client, monkeypatch):
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", lambda self: library)
+    with app.app_context():
+        untraced = client.post("/graphql", json={"query": "{ songs { title } }"})
+    with app.app_context():
+        traced = client.post(
+            "/graphql",
+            json={"query": "{ songs { title } }"},
+            headers={"X-GraphQL-Trace": "1"},
+        )
+
+    assert "tracing" not in untraced.get_json()["extensions"]
+    tracing = traced.get_json()["extensions"]["tracing"]
+    assert tracing["version"] == 1
+    assert tracing["duration"] > 0
+    assert [resolver["path"] for resolver in tracing["execution"]["resolvers"]] == [
+        ["songs"],
+        ["songs", 0, "title"],
+    ]
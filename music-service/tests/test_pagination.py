@@ -0,0 +1,29 @@
+from pytest import raises
+
+from music_service.pagination import decode_cursor, encode_cursor, page
+
+keys = [("a", 0), ("b", 2), ("b", 3), ("c", 1)]
+
+
+def test_cursor_round_trips():
+    assert decode_cursor(encode_cursor(("b", 2))) == ("b", 2)
+    assert decode_cursor(encode_cursor("name")) == "name"
+
+
+def test_page_starts_after_cursor():
+    assert page(keys, first=2) == ([("a", 0), ("b", 2)], False, True)
+    assert page(keys, first=2, after=encode_cursor(("b", 2))) == (
+        [("b", 3), ("c", 1)],
+        True,
+        False,
+    )
+    assert page(keys, after=encode_cursor(("c", 1))) == ([], True, False)
+
+
+def test_invalid_arguments_are_rejected():
+    with raises(ValueError):
+        page(keys, after="not a cursor")
+    with raises(ValueError):
+        page(keys, after=encode_cursor("b"))
+    with raises(ValueError):
+        page(keys, first=-1)
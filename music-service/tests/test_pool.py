@@ -0,0 +1,93 @@
+from music_service.pool import SessionPool
+
+
+class Clock:
+    now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class Session:
+    def __init__(self, key="account", ready=True):
+        self.session_key = key
+        self.ready = ready
+        self.closed = False
+        self.reset_count = 0
+
+    def is_ready(self):
+        return self.ready
+
+    def reset(self):
+        self.reset_count += 1
+
+    def close(self):
+        self.closed = True
+
+
+def test_released_session_is_reused():
+    pool = SessionPool()
+    session = Session()
+    pool.release(session)
+
+    assert pool.acquire("account") is session
+    assert pool.acquire("account") is None
+    assert session.reset_count == 1
+    assert not session.closed
+
+
+def test_sessions_are_kept_per_account():
+    pool = SessionPool()
+    session = Session("first")
+    pool.release(session)
+
+    assert pool.acquire("second") is None
+    assert pool.acquire("first") is session
+
+
+def test_idle_sessions_expire():
+    clock = Clock()
+    pool = SessionPool(idle_timeout=10, clock=clock)
+    session = Session()
+    pool.release(session)
+
+    clock.now = 10
+    assert pool.acquire("account") is None
+    assert session.closed
+
+
+def test_sessions_over_cap_are_closed():
+    pool = SessionPool(max_per_account=1)
+    first, second = Session(), Session()
+    pool.release(first)
+    pool.release(second)
+
+    assert len(pool) == 1
+    assert not first.closed
+    assert second.closed
+
+
+def test_unhealthy_sessions_are_discarded():
+    pool = SessionPool()
+    healthy, unhealthy = Session(), Session()
+    pool.release(healthy)
+    pool.release(unhealthy)
+    unhealthy.ready = False
+
+    assert pool.acquire("account") is healthy
+    assert unhealthy.closed
+
+    anonymous = Session(key=None)
+    pool.release(anonymous)
+    assert anonymous.closed
+    assert len(pool) == 0
+
+
+def test_clear_closes_idle_sessions():
+    pool = SessionPool()
+    session = Session()
+    pool.release(session)
+
+    pool.clear()
+    assert session.closed
+    assert len(pool) == 0
@@ -0,0 +1,97 @@
+import threading
+
+from werkzeug.datastructures import Headers
+
+from music_service.db import get_db
+from music_service.refresh import LibraryRefresher
+
+
+class Clock:
+    now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_recently_active_accounts_are_refreshed_first():
+    clock = Clock()
+    refresher = LibraryRefresher(workers=1, clock=clock)
+    started = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def blocking():
+        started.set()
+        release.wait()
+
+    refresher.schedule("busy", blocking)
+    started.wait()
+    for key, active_at in (("idle", 1), ("active", 3), ("recent", 2)):
+        clock.now = active_at
+        refresher.schedule(key, lambda key=key: order.append(key))
+    clock.now = 4
+    refresher.schedule("idle", lambda: order.append("idle"))
+
+    assert not refresher.schedule("busy", blocking)
+    assert len(refresher) == 4
+    release.set()
+    refresher.shutdown()
+
+    assert order == ["idle", "active", "recent"]
+    assert len(refresher) == 0
+
+
+def test_failed_refreshes_are_logged(caplog):
+    def refresh():
+        raise RuntimeError("upstream failed")
+
+    refresher = LibraryRefresher()
+    refresher.schedule("account", refresh)
+    refresher.shutdown()
+
+    assert "Background library refresh failed" in caplog.text
+
+
+def test_stale_library_is_served_while_refreshing(app, monkeypatch, credentials):
+    clock = Clock()
+    release = threading.Event()
+    calls = []
+
+    def get_all_songs(self, updated_after=None):
+        calls.append(updated_after)
+        if updated_after is None:
+            return [{"id": 1}]
+        release.wait()
+        return [{"id": 2}]
+
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", get_all_songs)
+    app.extensions["library_cache"].clock = clock
+    app.extensions["library_cache"].ttl = 300
+    app.extensions["library_refresher"].soft_ttl = 60
+    headers = Headers({"Mobile-Client-Authorization": credentials()})
+
+    def songs():
+        with app.app_context(), app.test_request_context(headers=headers):
+            return [song["id"] for song in get_db().get_songs()]
+
+    assert songs() == [1]
+    clock.now = 30
+    assert songs() == [1]
+    assert len(app.extensions["library_refresher"]) == 0
+
+    clock.now = 90
+    assert songs() == [1]
+    assert songs() == [1]
+    release.set()
+    app.extensions["library_refresher"].shutdown()
+    assert len(calls) == 2
+    assert songs() == [1, 2]
+
+    clock.now = 1000
+    release.clear()
+    blocked = threading.Thread(target=songs)
+    blocked.start()
+    blocked.join(0.1)
+    assert blocked.is_alive()
+    release.set()
+    blocked.join()
@@ -362,3 +362,119 @@ def test_graphql_albums(query, expected, client, monkeypatch):
     response = client.post("/graphql", data={"query": query})
     assert response.get_json()["data"]["albums"] == expected
 
+
+def test_graphql_order_by(client, monkeypatch):
+    monkeypatch.setattr(
+        "gmusicapi.Mobileclient.get_all_songs",
+        lambda *args: [
+            {"id": 1, "title": "Old", "album": "B", "year": 1990},
+            {"id": 2, "title": "New", "album": "A", "year": 2010},
+        ],
+    )
+    response = client.post(
+        "/graphql",
+        data={
+            "query": """{
+                songs(orderBy: YEAR, first: 1) { title }
+                albums(orderBy: YEAR) { name }
+                artists(orderBy: RECENTLY_ADDED) { name }
+            }"""
+        },
+    )
+    assert response.get_json()["data"] == {
+        "songs": [{"title": "Old"}],
+        "albums": [{"name": "B"}, {"name": "A"}],
+        "artists": [],
+    }
+
+
+def test_graphql_songs_connection(client, monkeypatch):
+    monkeypatch.setattr(
+        "gmusicapi.Mobileclient.get_all_songs", lambda *args: library,
+    )
+    query = """query ($after: String) {
+        songsConnection(first: 2, after: $after) {
+            edges {
+                cursor
+                node {
+                    title
+                }
+            }
+            pageInfo {
+                endCursor
+                hasNextPage
+            }
+        }
+    }"""
+
+    response = client.post("/graphql", json={"query": query})
+    connection = response.get_json()["data"]["songsConnection"]
+    assert [edge["node"]["title"] for edge in connection["edges"]] == [
+        "Song 1",
+        "Song 2",
+    ]
+    assert connection["pageInfo"]["hasNextPage"]
+
+    response = client.post(
+        "/graphql",
+        json={
+            "query": query,
+            "variables": {"after": connection["pageInfo"]["endCursor"]},
+        },
+    )
+    connection = response.get_json()["data"]["songsConnection"]
+    assert [edge["node"]["title"] for edge in connection["edges"]] == ["Song 3"]
+    assert not connection["pageInfo"]["hasNextPage"]
+
+
+@mark.parametrize(
+    "query,expected",
+    [
+        (
+            """{
+                artistsConnection(first: 1) {
+                    edges {
+                        node {
+                            name
+                        }
+                    }
+                    pageInfo {
+                        hasNextPage
+                    }
+                }
+            }""",
+            {
+                "artistsConnection": {
+                    "edges": [{"node": {"name": "Artist 1"}}],
+                    "pageInfo": {"hasNextPage": True},
+                }
+            },
+        ),
+        (
+            """{
+                albumsConnection(search: "song 2") {
+                    edges {
+                        node {
+                            name
+                        }
+                    }
+                    pageInfo {
+                        hasNextPage
+                    }
+                }
+            }""",
+            {
+                "albumsConnection": {
+                    "edges": [{"node": {"name": "Album 2"}}],
+                    "pageInfo": {"hasNextPage": False},
+                }
+            },
+        ),
+    ],
+)
+def test_graphql_connections(query, expected, client, monkeypatch):
+    monkeypatch.setattr(
+        "gmusicapi.Mobileclient.get_all_songs", lambda *args: library,
+    )
+    response = client.post("/graphql", data={"query": query})
+    assert response.get_json()["data"] == expected
@@ -0,0 +1,110 @@
+from datetime import datetime, timezone
+
+from werkzeug.datastructures import Headers
+
+from music_service import create_app
+from music_service.db import get_db
+from music_service.library import Library
+from music_service.shared import SharedLibraryStore
+
+synced_at = datetime(2020, 4, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+songs = [
+    {
+        "id": "a",
+        "title": "One",
+        "artist": "Ärtist",
+        "album": "Album",
+        "year": 2001,
+        "creationTimestamp": "1461792390958410",
+        "albumArtRef": [{"url": "http://art/1"}, {"url": "http://art/2"}],
+    },
+    {"id": "b", "title": "Two", "trackNumber": 3},
+]
+
+
+def test_shared_store_round_trips(tmp_path):
+    store = SharedLibraryStore(str(tmp_path))
+    library = Library(songs, synced_at=synced_at)
+    store.save("account", library)
+
+    mapped = store.load("account")
+    assert [dict(song) for song in mapped.songs] == [
+        dict(song) for song in library.songs
+    ]
+    assert mapped.synced_at == synced_at
+    assert mapped.version == library.version
+    assert mapped.ordered_songs("recently_added")[0] == 0
+    assert store.load("account") is mapped
+    assert store.load("other") is None
+
+    store.save("numbers", Library([{"id": 1}, {"id": 2}]))
+    assert [song["id"] for song in store.load("numbers").songs] == [1, 2]
+    assert store.load("numbers").synced_at is None
+
+
+def test_readers_keep_their_generation_until_the_next_load(tmp_path):
+    writer = SharedLibraryStore(str(tmp_path))
+    reader = SharedLibraryStore(str(tmp_path))
+    writer.save("account", Library(songs[:1], synced_at=synced_at))
+    first = reader.load("account")
+    assert reader.latest("account", first) is None
+
+    writer.save("account", Library(songs, synced_at=synced_at))
+    assert writer.generation("account") == 2
+    assert [song["id"] for song in first.songs] == ["a"]
+
+    second = reader.latest("account", first)
+    assert [song["id"] for song in second.songs] == ["a", "b"]
+    assert reader.latest("account", second) is None
+
+
+def test_corrupt_and_foreign_files_are_ignored(tmp_path, monkeypatch):
+    store = SharedLibraryStore(str(tmp_path))
+    store.save("account", Library(songs, synced_at=synced_at))
+
+    with open(store.path("account"), "r+b") as f:
+        f.seek(-1, 2)
+        byte = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    assert SharedLibraryStore(str(tmp_path)).load("account") is None
+
+    store.save("account", Library(songs, synced_at=synced_at))
+    monkeypatch.setattr("music_service.shared.VERSION", 2)
+    assert SharedLibraryStore(str(tmp_path)).load("account") is None
+
+
+def test_delete_removes_library(tmp_path):
+    store = SharedLibraryStore(str(tmp_path))
+    store.save("account", Library(songs, synced_at=synced_at))
+
+    store.delete("account")
+    store.delete("account")
+    assert store.load("account") is None
+
+
+def test_workers_share_one_fetch(app, monkeypatch, credentials, tmp_path):
+    calls = []
+
+    def get_all_songs(self, updated_after=None):
+        calls.append(updated_after)
+        return [{"id": "a", "title": "One"}]
+
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", get_all_songs)
+    config = {
+        "TESTING": True,
+        "LIBRARY_SNAPSHOT_DIR": str(tmp_path / "shared"),
+        "ALBUM_ART_DIR": str(tmp_path / "art"),
+        "LIBRARY_SHARED_STORE": True,
+    }
+    workers = [create_app(config), create_app(config)]
+    headers = Headers({"Mobile-Client-Authorization": credentials()})
+
+    with workers[0].app_context(), workers[0].test_request_context(headers=headers):
+        assert list(get_db().get_songs()) == [{"id": "a", "title": "One"}]
+    workers[0].extensions["library_executor"].shutdown(wait=True)
+
+    with workers[1].app_context(), workers[1].test_request_context(headers=headers):
+        assert list(get_db().get_songs()) == [{"id": "a", "title": "One"}]
+    workers[1].extensions["library_refresher"].shutdown(wait=True)
+    assert calls == [None]
@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+
+from music_service.library import Library
+from music_service.snapshot import SnapshotStore
+
+synced_at = datetime(2020, 4, 1, tzinfo=timezone.utc)
+
+
+def test_snapshot_round_trips(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    store.save("account", Library([{"id": 1, "title": "One"}], synced_at=synced_at))
+
+    library = store.load("account")
+    assert list(library.songs) == [{"id": 1, "title": "One"}]
+    assert library.synced_at == synced_at
+    assert store.load("other") is None
+
+
+def test_corrupt_snapshots_are_ignored(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    store.save("account", Library([{"id": 1}], synced_at=synced_at))
+
+    with open(store.path("account"), "r+b") as f:
+        f.seek(-1, 2)
+        byte = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    assert store.load("account") is None
+
+
+def test_snapshots_from_other_versions_are_ignored(tmp_path, monkeypatch):
+    store = SnapshotStore(str(tmp_path))
+    store.save("account", Library([{"id": 1}], synced_at=synced_at))
+
+    monkeypatch.setattr("music_service.snapshot.VERSION", 2)
+    assert store.load("account") is None
+
+
+def test_delete_removes_snapshot(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    store.save("account", Library([], synced_at=synced_at))
+
+    store.delete("account")
+    store.delete("account")
+    assert store.load("account") is None
+
+
+def test_outdated_saves_are_discarded(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+
+    assert not store.save("account", Library([{"id": 1}]), current=lambda: False)
+    assert store.load("account") is None
+    assert list(tmp_path.iterdir()) == []
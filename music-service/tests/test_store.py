@@ -0,0 +1,76 @@
+import json
+import tracemalloc
+
+from music_service.store import SongStore
+
+songs = [
+    {
+        "id": "1",
+        "title": "Song 1",
+        "artist": "Artist 1",
+        "album": "Album 1",
+        "year": 2020,
+        "trackNumber": 1,
+        "albumArtRef": [{"url": "fakeurl.com/album1.jpg"}],
+        "composer": "",
+        "estimatedSize": "17229205",
+    },
+    {"id": "2", "title": "Song 2"},
+]
+
+
+def test_rows_read_schema_fields():
+    store = SongStore(songs)
+
+    assert len(store) == 2
+    assert store[0] == {
+        "id": "1",
+        "title": "Song 1",
+        "artist": "Artist 1",
+        "album": "Album 1",
+        "year": 2020,
+        "trackNumber": 1,
+        "albumArtRef": [{"url": "fakeurl.com/album1.jpg"}],
+    }
+    assert store[-1] == {"id": "2", "title": "Song 2"}
+    assert "year" not in store[1]
+    assert store[1].get("trackNumber", 1) == 1
+    assert store[0].title == "Song 1"
+    assert store.column("year") == [2020, None]
+
+
+def test_strings_are_shared():
+    store = SongStore(json.loads(json.dumps([songs[0], {**songs[0], "id": "3"}])))
+
+    assert store.strings["artist"][0] is store.strings["artist"][1]
+    assert store.art_urls[0][0] is store.art_urls[1][0]
+
+
+def test_store_is_smaller_than_song_dicts():
+    library = json.dumps(
+        [
+            dict(
+                songs[0],
+                id=str(i),
+                title="Song {}".format(i),
+                artist="Artist {}".format(i % 50),
+                album="Album {}".format(i % 200),
+            )
+            for i in range(2000)
+        ]
+    )
+
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        dicts = json.loads(library)
+        dict_size = tracemalloc.get_traced_memory()[0] - start
+
+        start = tracemalloc.get_traced_memory()[0]
+        store = SongStore(json.loads(library))
+        store_size = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+
+    assert len(store) == len(dicts)
+    assert store_size < dict_size / 2
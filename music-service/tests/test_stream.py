@@ -0,0 +1,93 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pytest import raises
+from werkzeug.datastructures import Headers
+
+from music_service.stream import LibraryStream, LibraryStreams
+
+
+def test_stream_publishes_partial_libraries():
+    stream = LibraryStream(synced_at=None)
+    stream.add([{"id": 1}])
+
+    assert not stream.wait(lambda library: True).complete
+    assert len(stream.wait(lambda library: len(library.songs) >= 1).songs) == 1
+
+    stream.add([{"id": 2}])
+    library = stream.finish()
+    assert library.complete
+    assert stream.wait() is library
+    assert len(library.songs) == 2
+
+
+def test_partial_library_filters_loaded_songs():
+    stream = LibraryStream(synced_at=None)
+    stream.add([{"id": 1, "title": "Song A"}, {"id": 2, "title": "Other"}])
+    stream.add([{"id": 3, "title": "B", "artist": "Song Writer"}])
+    library = stream.wait(lambda library: len(library.songs) == 3)
+
+    assert [song["id"] for song in library.find(search="song")] == [1, 3]
+    assert [song["id"] for song in library.find(title="OTH")] == [2]
+
+
+def test_stream_errors_reach_waiters():
+    stream = LibraryStream(synced_at=None)
+    stream.fail(ValueError("upstream failed"))
+
+    with raises(ValueError):
+        stream.wait()
+
+
+def test_streams_are_shared_per_key():
+    release = threading.Event()
+
+    def produce(stream):
+        release.wait()
+        stream.finish()
+
+    streams = LibraryStreams(ThreadPoolExecutor(max_workers=1))
+    stream = streams.start("account", None, produce)
+    assert streams.start("account", None, produce) is stream
+    assert streams.get("account") is stream
+
+    release.set()
+    stream.wait()
+    streams.executor.shutdown(wait=True)
+    assert streams.get("account") is None
+
+
+def test_unsorted_query_returns_before_library_is_loaded(
+    app, client, monkeypatch, credentials
+):
+    release = threading.Event()
+
+    def get_all_songs(self, incremental=False):
+        yield [{"id": 2, "title": "Song 2"}, {"id": 1, "title": "Song 1"}]
+        release.wait()
+        yield [{"id": 3, "title": "Song 3"}]
+
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", get_all_songs)
+    app.extensions["library_streams"] = LibraryStreams(
+        app.extensions["library_executor"]
+    )
+    headers = Headers({"Mobile-Client-Authorization": credentials()})
+
+    def query(query):
+        with app.app_context():
+            response = client.post("/graphql", json={"query": query}, headers=headers)
+        return response.get_json()["data"]
+
+    try:
+        assert query("{ songs(first: 1, sorted: false) { title } }") == {
+            "songs": [{"title": "Song 2"}]
+        }
+        assert query("{ libraryStatus { loadedSongs complete } }") == {
+            "libraryStatus": {"loadedSongs": 2, "complete": False}
+        }
+    finally:
+        release.set()
+
+    assert query("{ songs { title } }") == {
+        "songs": [{"title": "Song 1"}, {"title": "Song 2"}, {"title": "Song 3"}]
+    }
@@ -0,0 +1,239 @@
+import json
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from oauth2client.client import HttpAccessTokenRefreshError, OAuth2Credentials
+from werkzeug.datastructures import Headers
+
+from music_service.db import (
+    account_key,
+    get_db,
+    header_credentials,
+    json_to_credentials,
+)
+from music_service.tokens import TokenManager
+
+NOW = datetime(2020, 4, 1, 12, 0, 0)
+
+
+class Clock:
+    now = NOW
+
+    def __call__(self):
+        return self.now
+
+
+class TokenEndpoint:
+    def __init__(self, lifetime=timedelta(hours=1), clock=Clock()):
+        self.lifetime = lifetime
+        self.clock = clock
+        self.calls = 0
+        self.error = None
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self._lock = threading.Lock()
+
+    def __call__(self, credentials, http):
+        self.started.set()
+        self.release.wait()
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        if self.error is not None:
+            raise self.error
+        credentials.access_token = "access-{}".format(calls)
+        credentials.token_expiry = self.clock() + self.lifetime
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def endpoint(monkeypatch, clock):
+    endpoint = TokenEndpoint(clock=clock)
+    monkeypatch.setattr(
+        OAuth2Credentials, "refresh", lambda self, http: endpoint(self, http)
+    )
+    return endpoint
+
+
+@pytest.fixture
+def tokens(clock):
+    tokens = TokenManager(refresh_ahead=300, clock=clock)
+    yield tokens
+    tokens.shutdown()
+
+
+def oauth_credentials(refresh_token="token", access_token="", expiry=0):
+    return json_to_credentials(
+        {
+            "accessToken": access_token,
+            "clientId": "",
+            "clientSecret": "",
+            "refreshToken": refresh_token,
+            "tokenExpiry": expiry,
+            "tokenUri": "",
+            "userAgent": "",
+        }
+    )
+
+
+def milliseconds(expiry):
+    return int((expiry - datetime(1970, 1, 1)).total_seconds() * 1000)
+
+
+def test_header_expiry_is_parsed():
+    expiry = datetime(2020, 4, 1, 13, 0, 0)
+
+    assert oauth_credentials(expiry=milliseconds(expiry)).token_expiry == expiry
+    assert oauth_credentials(expiry="2020-04-01T13:00:00Z").token_expiry == expiry
+    assert oauth_credentials(expiry=0).token_expiry is None
+
+
+def test_valid_header_tokens_are_not_refreshed(tokens, endpoint):
+    credentials = tokens.manage(
+        oauth_credentials(
+            access_token="header", expiry=milliseconds(NOW + timedelta(hours=1))
+        )
+    )
+    credentials.refresh(None)
+
+    assert endpoint.calls == 0
+    assert credentials.access_token == "header"
+    assert not credentials.invalid
+
+
+def test_refreshed_tokens_are_shared_by_later_requests(tokens, endpoint):
+    first = tokens.manage(oauth_credentials())
+    first.refresh(None)
+    second = tokens.manage(oauth_credentials())
+
+    assert endpoint.calls == 1
+    assert second.access_token == first.access_token == "access-1"
+    assert second.token_expiry == NOW + timedelta(hours=1)
+    second.refresh(None)
+    assert endpoint.calls == 1
+
+
+def test_concurrent_refreshes_share_one_request(tokens, endpoint):
+    endpoint.release.clear()
+    credentials = [tokens.manage(oauth_credentials()) for _ in range(8)]
+    threads = [
+        threading.Thread(target=managed.refresh, args=(None,))
+        for managed in credentials
+    ]
+    for thread in threads:
+        thread.start()
+    assert endpoint.started.wait(5)
+    endpoint.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert endpoint.calls == 1
+    assert {managed.access_token for managed in credentials} == {"access-1"}
+
+
+def test_tokens_are_refreshed_ahead_of_expiry(tokens, endpoint, clock):
+    tokens.manage(oauth_credentials()).refresh(None)
+    token = tokens.cached(oauth_credentials())
+    clock.now = NOW + timedelta(minutes=56)
+    tokens.manage(oauth_credentials())
+    tokens._refresh_ahead(account_key(oauth_credentials()), token)
+
+    credentials = tokens.manage(oauth_credentials())
+    assert endpoint.calls == 2
+    assert credentials.access_token == "access-2"
+    assert credentials.token_expiry == clock.now + timedelta(hours=1)
+
+
+def test_background_refresh_fires_before_expiry(endpoint):
+    endpoint.clock = datetime.utcnow
+    tokens = TokenManager(refresh_ahead=3600 - 0.1)
+    try:
+        tokens.manage(oauth_credentials()).refresh(None)
+        endpoint.started.clear()
+        assert endpoint.started.wait(5)
+    finally:
+        tokens.shutdown()
+
+    assert endpoint.calls >= 2
+    assert tokens.cached(oauth_credentials()).access_token != "access-1"
+
+
+def test_idle_tokens_are_dropped_instead_of_refreshed(tokens, endpoint, clock):
+    tokens.manage(oauth_credentials()).refresh(None)
+    token = tokens.cached(oauth_credentials())
+    clock.now = NOW + timedelta(hours=2)
+    tokens._refresh_ahead(account_key(oauth_credentials()), token)
+
+    assert endpoint.calls == 1
+    assert len(tokens) == 0
+
+
+def test_refresh_failures_invalidate_credentials(tokens, endpoint):
+    endpoint.error = HttpAccessTokenRefreshError("invalid_grant")
+    credentials = tokens.manage(oauth_credentials())
+
+    with pytest.raises(HttpAccessTokenRefreshError):
+        credentials.refresh(None)
+    assert credentials.invalid
+    assert len(tokens) == 0
+
+
+def test_requests_use_managed_credentials(app, credentials, endpoint):
+    endpoint.clock = datetime.utcnow
+    tokens = app.extensions["oauth_tokens"]
+    headers = Headers({"Mobile-Client-Authorization": credentials()})
+    header_credentials(headers, "Mobile-Client-Authorization", tokens).refresh(None)
+
+    with app.test_request_context(headers=headers):
+        db = get_db()
+
+    assert db.mobile_credentials.access_token == "access-1"
+    db.mobile_credentials.refresh(None)
+    assert endpoint.calls == 1
+
+
+def test_client_header_tokens_skip_the_first_refresh(app, endpoint):
+    expiry = datetime.utcnow().replace(microsecond=0) + timedelta(hours=1)
+    header = json.dumps(
+        {
+            "accessToken": "from-client",
+            "clientId": "",
+            "clientSecret": "",
+            "refreshToken": "token",
+            "tokenExpiry": milliseconds(expiry),
+            "tokenUri": "",
+            "userAgent": "",
+        }
+    )
+
+    with app.test_request_context(
+        headers=Headers({"Mobile-Client-Authorization": header})
+    ):
+        credentials = get_db().mobile_credentials
+    credentials.refresh(None)
+
+    assert endpoint.calls == 0
+    assert credentials.access_token == "from-client"
+    assert credentials.token_expiry == expiry
+
+
+def test_accounts_share_one_scheduler_thread(tokens, endpoint):
+    before = threading.active_count()
+    for index in range(50):
+        tokens.manage(
+            oauth_credentials(
+                refresh_token="token-{}".format(index),
+                access_token="header",
+                expiry=milliseconds(NOW + timedelta(hours=1)),
+            )
+        )
+
+    assert len(tokens) == 50
+    assert threading.active_count() == before + 1
+    assert endpoint.calls == 0
@@ -0,0 +1,197 @@
+import hashlib
+import threading
+
+from werkzeug.datastructures import Headers
+
+from music_service.upload import metadata_key
+
+known = b"known song"
+
+
+def upload_directory(app, tmp_path):
+    directory = tmp_path / "music"
+    directory.mkdir()
+    (directory / "known.mp3").write_bytes(known)
+    (directory / "copy.mp3").write_bytes(b"new song")
+    (directory / "album").mkdir()
+    (directory / "album" / "one.mp3").write_bytes(b"new song")
+    (directory / "album" / "two.flac").write_bytes(b"tagged song")
+    (directory / "album" / "three.ogg").write_bytes(b"third song")
+    (directory / "album" / "cover.jpg").write_bytes(b"not audio")
+    app.extensions["uploader"].directory = str(directory)
+    return directory
+
+
+def stand_in_files(monkeypatch):
+    monkeypatch.setattr(
+        "music_service.upload.content_hash",
+        lambda path: hashlib.md5(open(path, "rb").read()).hexdigest(),
+    )
+    monkeypatch.setattr(
+        "music_service.upload.read_metadata",
+        lambda path: metadata_key("Known Title", "Artist", "Album")
+        if path.endswith("two.flac")
+        else None,
+    )
+    monkeypatch.setattr(
+        "gmusicapi.Mobileclient.get_all_songs",
+        lambda self: [
+            {
+                "id": 1,
+                "title": "known title",
+                "artist": "Artist",
+                "album": "Album",
+                "clientId": hashlib.md5(known).hexdigest(),
+            }
+        ],
+    )
+
+
+def graphql(app, client, credentials, query, variables=None):
+    credential = credentials()
+    with app.app_context():
+        response = client.post(
+            "/graphql",
+            json={"query": query, "variables": variables},
+            headers=Headers(
+                {
+                    "Mobile-Client-Authorization": credential,
+                    "Music-Manager-Authorization": credential,
+                }
+            ),
+        )
+    return response.get_json()
+
+
+def test_files_are_uploaded_with_duplicates_skipped(
+    app, client, monkeypatch, tmp_path, credentials
+):
+    upload_directory(app, tmp_path)
+    stand_in_files(monkeypatch)
+
+    result = graphql(
+        app,
+        client,
+        credentials,
+        "mutation ($paths: [String!]!) { uploadSongs(paths: $paths) { id } }",
+        {"paths": ["known.mp3", "copy.mp3", "album"]},
+    )
+    job_id = result["data"]["uploadSongs"]["id"]
+    app.extensions["uploader"].shutdown()
+
+    job = graphql(
+        app,
+        client,
+        credentials,
+        """query ($id: ID!) {
+            uploadJob(id: $id) {
+                done uploaded skipped failed
+                files { path status reason songId }
+            }
+        }""",
+        {"id": job_id},
+    )["data"]["uploadJob"]
+    files = {
+        file["path"].split("music/")[1]: (file["status"], file["reason"])
+        for file in job["files"]
+    }
+
+    assert job["done"]
+    assert (job["uploaded"], job["skipped"], job["failed"]) == (2, 3, 0)
+    assert files["known.mp3"] == ("skipped", "DUPLICATE_CONTENT")
+    assert files["album/two.flac"] == ("skipped", "DUPLICATE_METADATA")
+    assert files["album/three.ogg"] == ("uploaded", None)
+    assert sorted(files[path][0] for path in ("copy.mp3", "album/one.mp3")) == [
+        "skipped",
+        "uploaded",
+    ]
+    assert "album/cover.jpg" not in files
+
+
+def test_uploads_run_on_a_bounded_pool(app, client, monkeypatch, tmp_path, credentials):
+    directory = upload_directory(app, tmp_path)
+    for index in range(8):
+        (directory / "{}.mp3".format(index)).write_bytes(str(index).encode())
+    stand_in_files(monkeypatch)
+
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def upload(self, filepaths, **kwargs):
+        with lock:
+            running.append(filepaths)
+            peak.append(len(running))
+        threading.Event().wait(0.01)
+        with lock:
+            running.remove(filepaths)
+        return {}, {}, {path: "ALREADY_EXISTS" for path in filepaths}
+
+    monkeypatch.setattr("gmusicapi.Musicmanager.upload", upload)
+    graphql(
+        app, client, credentials, 'mutation { uploadSongs(paths: ["."]) { id } }',
+    )
+    app.extensions["uploader"].shutdown()
+
+    assert len(peak) == 10
+    assert 1 < max(peak) <= app.extensions["uploader"].workers
+
+
+def test_invalid_uploads_are_rejected(app, client, tmp_path, credentials):
+    query = "mutation ($paths: [String!]!) { uploadSongs(paths: $paths) { id } }"
+
+    result = graphql(app, client, credentials, query, {"paths": ["a.mp3"]})
+    assert result["errors"][0]["message"] == "Uploads are disabled on this server."
+
+    upload_directory(app, tmp_path)
+    result = graphql(app, client, credentials, query, {"paths": ["../secret.mp3"]})
+    assert "outside the upload directory" in result["errors"][0]["message"]
+    result = graphql(app, client, credentials, query, {"paths": ["missing.mp3"]})
+    assert "does not exist" in result["errors"][0]["message"]
+
+
+def test_upload_progress_is_never_served_from_cache(
+    app, client, monkeypatch, tmp_path, credentials
+):
+    upload_directory(app, tmp_path)
+    stand_in_files(monkeypatch)
+    release = threading.Event()
+
+    def upload(self, filepaths, **kwargs):
+        release.wait(5)
+        return {path: "server-" + path for path in filepaths}, {}, {}
+
+    monkeypatch.setattr("gmusicapi.Musicmanager.upload", upload)
+    job_id = graphql(
+        app,
+        client,
+        credentials,
+        'mutation { uploadSongs(paths: ["copy.mp3"]) { id } }',
+    )["data"]["uploadSongs"]["id"]
+
+    def poll():
+        credential = credentials()
+        with app.app_context():
+            return client.post(
+                "/graphql",
+                json={
+                    "query": """query ($id: ID!) {
+                        ...Progress
+                    }
+                    fragment Progress on RootQuery { uploadJob(id: $id) { done uploaded } }
+                    """,
+                    "variables": {"id": job_id},
+                },
+                headers=Headers({"Mobile-Client-Authorization": credential}),
+            )
+
+    response = poll()
+    assert response.get_json()["data"]["uploadJob"] == {"done": False, "uploaded": 0}
+    assert "ETag" not in response.headers
+
+    release.set()
+    app.extensions["uploader"].shutdown()
+
+    response = poll()
+    assert response.get_json()["data"]["uploadJob"] == {"done": True, "uploaded": 1}
+    assert "ETag" not in response.headers
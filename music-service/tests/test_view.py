@@ -0,0 +1,174 @@
+from werkzeug.datastructures import Headers
+
+library = [{"id": 1, "title": "Song 1"}, {"id": 2, "title": "Song 2"}]
+
+
+def post(app, client, **kwargs):
+    with app.app_context():
+        return client.post("/graphql", **kwargs)
+
+
+def test_responses_carry_etag_and_answer_not_modified(
+    app, client, monkeypatch, credentials
+):
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", lambda *args: library)
+    headers = Headers({"Mobile-Client-Authorization": credentials()})
+
+    response = post(app, client, json={"query": "{ songs { title } }"}, headers=headers)
+    assert response.get_json()["data"]["songs"][0]["title"] == "Song 1"
+    etag = response.headers["ETag"]
+
+    response = post(
+        app,
+        client,
+        json={"query": "{\n  songs {\n    title\n  }\n}"},
+        headers=Headers(
+            {"Mobile-Client-Authorization": credentials(), "If-None-Match": etag}
+        ),
+    )
+    assert response.status_code == 304
+
+    response = post(app, client, json={"query": "{ songs { id } }"}, headers=headers)
+    assert response.headers["ETag"] != etag
+
+
+def test_cached_response_is_invalidated_with_library(
+    app, client, monkeypatch, credentials
+):
+    monkeypatch.setattr(
+        "gmusicapi.Mobileclient.get_all_songs", lambda *args, **kwargs: library
+    )
+    app.extensions["library_cache"].ttl = 0
+    headers = Headers({"Mobile-Client-Authorization": credentials()})
+    query = {"query": "{ songs { title } }"}
+
+    etag = post(app, client, json=query, headers=headers).headers["ETag"]
+    assert post(app, client, json=query, headers=headers).headers["ETag"] == etag
+
+    monkeypatch.setattr(
+        "gmusicapi.Mobileclient.get_all_songs",
+        lambda *args, **kwargs: [{"id": 2, "deleted": True}],
+    )
+    response = post(app, client, json=query, headers=headers)
+
+    assert response.headers["ETag"] != etag
+    assert response.get_json()["data"] == {"songs": [{"title": "Song 1"}]}
+
+
+def test_anonymous_and_failed_responses_are_not_cached(
+    app, client, monkeypatch, credentials
+):
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", lambda *args: library)
+
+    response = post(app, client, json={"query": "{ songs { title } }"})
+    assert "ETag" not in response.headers
+
+    response = post(
+        app,
+        client,
+        json={"query": "{ songs { missing } }"},
+        headers=Headers({"Mobile-Client-Authorization": credentials()}),
+    )
+    assert response.status_code == 400
+    assert "ETag" not in response.headers
+
+
+def test_malformed_requests_are_not_cached(app, client, monkeypatch, credentials):
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", lambda *args: library)
+    headers = Headers({"Mobile-Client-Authorization": credentials()})
+
+    response = post(app, client, json={"query": "{ songs {"}, headers=headers)
+    assert response.status_code == 400
+    assert "ETag" not in response.headers
+
+    response = post(app, client, json={}, headers=headers)
+    assert response.status_code == 400
+
+    response = post(
+        app,
+        client,
+        json={"query": "{ songs { title } }"},
+        headers=Headers({"Mobile-Client-Authorization": "{}"}),
+    )
+    assert "ETag" not in response.headers
+    assert response.get_json()["errors"]
+
+
+def test_library_failures_are_not_hidden(app, client, monkeypatch, credentials):
+    def get_all_songs(*args):
+        raise RuntimeError("upstream failed")
+
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", get_all_songs)
+    app.config["PROPAGATE_EXCEPTIONS"] = False
+
+    response = post(
+        app,
+        client,
+        json={"query": "{ songs { title } }"},
+        headers=Headers({"Mobile-Client-Authorization": credentials()}),
+    )
+    assert response.status_code == 500
+
+
+def test_batched_operations_share_one_library_fetch(
+    app, client, monkeypatch, credentials
+):
+    calls = []
+
+    def get_all_songs(*args, **kwargs):
+        calls.append(args)
+        return [
+            dict(song, artist="Artist", albumArtist="Artist", album="Album")
+            for song in library
+        ]
+
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", get_all_songs)
+    headers = Headers({"Mobile-Client-Authorization": credentials()})
+    batch = [
+        {"query": "{ songs { title } }"},
+        {"query": "{ artists { name } }"},
+        {"query": "query Albums { albums { name } }", "operationName": "Albums"},
+    ]
+
+    response = post(app, client, json=batch, headers=headers)
+    assert response.status_code == 200
+    assert [result["data"] for result in response.get_json()] == [
+        {"songs": [{"title": "Song 1"}, {"title": "Song 2"}]},
+        {"artists": [{"name": "Artist"}]},
+        {"albums": [{"name": "Album"}]},
+    ]
+    assert len(calls) == 1
+
+    etag = response.headers["ETag"]
+    response = post(
+        app,
+        client,
+        json=batch,
+        headers=Headers(
+            {"Mobile-Client-Authorization": credentials(), "If-None-Match": etag}
+        ),
+    )
+    assert response.status_code == 304
+    assert post(app, client, json=batch[:2], headers=headers).headers["ETag"] != etag
+
+
+def test_batched_results_carry_their_own_extensions(app, client, monkeypatch):
+    monkeypatch.setattr("gmusicapi.Mobileclient.get_all_songs", lambda self: library)
+
+    with app.app_context():
+        response = client.post(
+            "/graphql",
+            json=[
+                {"query": "{ songs { title } }"},
+                {"query": "{ libraryStatus { complete } }"},
+            ],
+            headers={"X-GraphQL-Trace": "1"},
+        )
+
+    first, second = response.get_json()
+    assert first["extensions"]["cost"]["requested"] == 5001
+    assert second["extensions"]["cost"]["requested"] == 2
+    assert [
+        resolver["path"]
+        for resolver in second["extensions"]["tracing"]["execution"]["resolvers"]
+    ] == [["libraryStatus"], ["libraryStatus", "complete"]]